@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+
+# Кэши, не общие для процессов: инвалидация из одного процесса
+# не дойдет до других.
+LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """Кэш API должен быть общим для всех процессов."""
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        'Кэш в памяти процесса: изменения справочников и связей '
+        'из других процессов в нем не видны.',
+        hint='Задайте общий кэш (CACHE_BACKEND), например FileBasedCache.',
+        id='api.W001',
+    )]
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        checks.register(check_shared_cache, checks.Tags.caches)
+        from . import signals  # noqa: F401
@@ -0,0 +1,155 @@
+"""
+Кэши API: готовые файлы (LRU в памяти и на диске) и версии
+справочников для кэша ответов.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from uuid import uuid4
+
+from django.core.cache import cache
+
+VERSION_KEY = 'generation:{}'
+# Каталог кэша пишут все процессы: его размер пересчитывается
+# сканированием не реже раза в столько секунд.
+DISK_SCAN_INTERVAL = 60
+# После вытеснения на диске остается такая доля max_disk_size.
+DISK_LOW_WATERMARK = 0.9
+
+
+def get_version(name):
+    """
+    Текущая версия данных `name` и время ее изменения. Версия -
+    неповторяющийся токен: если ключ вытеснен или кэш очищен, будет
+    новая версия, и старые записи не прочитаются.
+    """
+    key = VERSION_KEY.format(name)
+    value = cache.get(key)
+    if value is None:
+        value = (uuid4().hex, time.time())
+        cache.add(key, value, timeout=None)
+        value = cache.get(key) or value
+    return value
+
+
+def bump_version(name):
+    """Данные `name` изменились: старые записи кэша больше не читаются."""
+    value = (uuid4().hex, time.time())
+    cache.set(VERSION_KEY.format(name), value, timeout=None)
+    return value
+
+
+class RenderCache:
+    """
+    Кэш отрендеренных файлов по ключу-хэшу содержимого.
+
+    В памяти хранится не больше `max_size` байт, вытесняются давно
+    не использованные файлы. На диске файлы лежат в `directory`,
+    переживают перезапуск процесса и занимают не больше
+    `max_disk_size` байт: вытесняются файлы, которые дольше всех
+    не читали с диска (mtime обновляется при чтении).
+    """
+
+    def __init__(self, directory, max_size, max_disk_size=None, suffix=''):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.max_disk_size = max_disk_size
+        self.suffix = suffix
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_size = None
+        self._scanned = 0.0
+
+    def path(self, key):
+        return self.directory / f'{key}{self.suffix}'
+
+    def get(self, key):
+        with self._lock:
+            content = self._items.get(key)
+            if content is not None:
+                self._items.move_to_end(key)
+                return content
+        path = self.path(key)
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        with suppress(FileNotFoundError):
+            os.utime(path)
+        self._remember(key, content)
+        return content
+
+    def set(self, key, content):
+        self._remember(key, content)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Временные файлы с точкой в начале вытеснение не трогает.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(tmp, self.path(key))
+        self._trim_disk(len(content))
+
+    def get_or_render(self, key, render):
+        """Отдаем файл из кэша, при промахе рендерим и сохраняем."""
+        content = self.get(key)
+        if content is None:
+            content = render()
+            self.set(key, content)
+        return content
+
+    def _trim_disk(self, added):
+        if self.max_disk_size is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._disk_size is not None:
+                self._disk_size += added
+                if (
+                    self._disk_size <= self.max_disk_size
+                    and now - self._scanned < DISK_SCAN_INTERVAL
+                ):
+                    return
+            self._scanned = now
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(file_size for _, file_size, _ in files)
+        if size > self.max_disk_size:
+            for _, file_size, path in sorted(files):
+                if size <= self.max_disk_size * DISK_LOW_WATERMARK:
+                    break
+                with suppress(FileNotFoundError):
+                    os.remove(path)
+                size -= file_size
+        with self._lock:
+            self._disk_size = size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def _remember(self, key, content):
+        if len(content) > self.max_size:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = content
+            self.size += len(content)
+            while self.size > self.max_size:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
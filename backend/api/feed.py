@@ -0,0 +1,135 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Fan-out при записи: новый рецепт сразу добавляется в ленты
+(TimelineEntry) подписчиков автора, лента читается по индексу без
+JOIN с подписками. Когда подписчиков у автора становится больше
+FEED_FANOUT_MAX_SUBSCRIBERS, ему ставится User.feed_on_read: его
+рецепты по лентам не раскладываются, а читаются при запросе (fan-out
+при чтении) и сливаются с лентой по (pub_date, id). Флаг не снимается,
+иначе рецепты, опубликованные с ним, пропали бы из лент.
+В ленте пользователя хранится не больше FEED_MAX_LENGTH записей:
+лишние удаляются при раскладке, подписке и командой trim_feeds,
+чтение ленты ничего не пишет.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count
+from recipes.models import Recipe, Subscription, TimelineEntry, User
+
+from .pagination import after
+
+ORDERING = ('-pub_date', '-recipe_id')
+BATCH_SIZE = 1000
+
+
+def fans_out(author_id):
+    """Рецепты автора раскладываются по лентам подписчиков."""
+    User.objects.filter(
+        id=author_id, feed_on_read=False,
+        subscribers_count__gt=settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    ).update(feed_on_read=True)
+    return User.objects.filter(id=author_id, feed_on_read=False).exists()
+
+
+def save_entries(entries):
+    entries = iter(entries)
+    while batch := list(islice(entries, BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(author_id, recipes):
+    """Новые рецепты автора - в ленты его подписчиков."""
+    if not recipes or not fans_out(author_id):
+        return
+    subscribers = Subscription.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+    while users := list(islice(subscribers, BATCH_SIZE)):
+        save_entries(
+            TimelineEntry(
+                user_id=user_id, recipe_id=recipe.id,
+                pub_date=recipe.pub_date
+            )
+            for user_id in users for recipe in recipes
+        )
+        trim_feeds(users)
+
+
+def follow(user_id, author_id):
+    """Подписка: последние рецепты автора - в ленту подписчика."""
+    if not fans_out(author_id):
+        return
+    save_entries(
+        TimelineEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+        for recipe_id, pub_date in Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list(
+            'id', 'pub_date'
+        )[:settings.FEED_MAX_LENGTH]
+    )
+    trim(user_id)
+
+
+def unfollow(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def trim(user_id):
+    """Оставляем в ленте FEED_MAX_LENGTH самых новых записей."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    last = entries.order_by(*ORDERING).values_list(
+        'pub_date', 'recipe_id'
+    )[settings.FEED_MAX_LENGTH - 1:settings.FEED_MAX_LENGTH]
+    if last:
+        return entries.filter(after(ORDERING, last[0])).delete()[0]
+    return 0
+
+
+def trim_feeds(users=None):
+    """
+    Обрезаем ленты `users` (по умолчанию - все), в которых больше
+    FEED_MAX_LENGTH записей; вернем число удаленных.
+    """
+    entries = TimelineEntry.objects.order_by()
+    if users is not None:
+        entries = entries.filter(user_id__in=users)
+    return sum(
+        trim(user_id) for user_id in entries.values('user').annotate(
+            length=Count('id')
+        ).filter(length__gt=settings.FEED_MAX_LENGTH).values_list(
+            'user', flat=True
+        ).iterator()
+    )
+
+
+def feed(user, position, size):
+    """
+    До `size` позиций (pub_date, id рецепта) ленты `user` после
+    позиции `position` (None - с начала), новые сначала.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if position:
+        entries = entries.filter(after(ORDERING, position))
+    positions = list(
+        entries.order_by(*ORDERING).values_list('pub_date', 'recipe_id')[
+            :size
+        ]
+    )
+    authors = list(User.objects.filter(
+        subscribing__user=user, feed_on_read=True
+    ).values_list('id', flat=True))
+    if not authors:
+        return positions
+    recipes = Recipe.objects.filter(author_id__in=authors)
+    if position:
+        recipes = recipes.filter(after(('-pub_date', '-id'), position))
+    # Рецепт мог попасть в ленты, пока подписчиков у автора было меньше.
+    return sorted(set(positions) | set(
+        recipes.order_by('-pub_date', '-id').values_list('pub_date', 'id')[
+            :size
+        ]
+    ), reverse=True)[:size]
@@ -2,16 +2,17 @@
 Предоставляет набор подключаемых фильтров.
 """
 import django_filters
-from recipes.models import Ingredient, Recipe, Tag
+from django.conf import settings
+from django.db.models import Case, FloatField, Value, When
+from recipes import search
+from recipes.models import Recipe, Tag
 
+from .matcher import recipe_matcher
+from .relations import FILTER_MAX_IDS, get_relations
 
-class IngredientFilter(django_filters.FilterSet):
-    """Фильтр для модели Ingredient."""
-    name = django_filters.CharFilter(lookup_expr='istartswith')
 
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    """Список чисел через запятую: ?have=1,5,17."""
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -19,25 +20,101 @@ class RecipeFilter(django_filters.FilterSet):
     tags = django_filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags'
+    )
+    tags_match = django_filters.ChoiceFilter(
+        choices=(('any', 'любой из тегов'), ('all', 'все теги')),
+        method='filter_tags_match'
     )
     is_favorited = django_filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = django_filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = django_filters.CharFilter(method='filter_search')
+    have = NumberInFilter(method='filter_have')
+    max_missing = django_filters.NumberFilter(
+        method='filter_max_missing', min_value=0
+    )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+            'tags_match', 'search', 'have', 'max_missing'
+        )
 
-    def filter_is_favorited(self, queryset, name, value):
-        user = self.request.user
-        if value and not user.is_anonymous:
-            return queryset.filter(recipes_favorite__user=user)
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты с любым (?tags_match=all - со всеми) из тегов: по маске
+        tags_mask, без JOIN с таблицей связей и DISTINCT.
+        """
+        return queryset.with_tags(
+            [tag.bit for tag in value],
+            match_all=self.form.cleaned_data.get('tags_match') == 'all'
+        )
+
+    def filter_tags_match(self, queryset, name, value):
+        """Учитывается в filter_tags."""
         return queryset
 
-    def filter_is_in_shopping_cart(self, queryset, name, value):
-        user = self.request.user
-        if value and not user.is_anonymous:
-            return queryset.filter(recipes_cart__user=user)
+    def filter_have(self, queryset, name, value):
+        """
+        Рецепты с ингредиентами из списка по убыванию покрытия - доли
+        ингредиентов рецепта, которые уже есть у пользователя.
+        """
+        if not value:
+            return queryset
+        max_missing = self.form.cleaned_data.get('max_missing')
+        ids, coverage = recipe_matcher.match(
+            [int(ingredient) for ingredient in value],
+            max_missing=None if max_missing is None else int(max_missing),
+            limit=settings.MATCH_MAX_RESULTS
+        )
+        if not len(ids):
+            return queryset.none()
+        # Покрытий немного (дроби от числа ингредиентов): одна ветка
+        # CASE на каждое значение.
+        groups = {}
+        for recipe_id, value in zip(ids.tolist(), coverage.tolist()):
+            groups.setdefault(value, []).append(recipe_id)
+        return queryset.filter(id__in=ids.tolist()).annotate(
+            coverage=Case(
+                *(
+                    When(id__in=group, then=Value(value))
+                    for value, group in groups.items()
+                ),
+                output_field=FloatField()
+            )
+        ).order_by('-coverage', '-pub_date', '-id')
+
+    def filter_max_missing(self, queryset, name, value):
+        """Учитывается в filter_have."""
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, результаты по релевантности."""
+        return search.search(queryset, value) if value.strip() else queryset
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_relation(
+            queryset, value, 'favorites', 'recipes_favorite__user'
+        )
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_relation(
+            queryset, value, 'cart', 'recipes_cart__user'
+        )
+
+    def filter_relation(self, queryset, value, kind, lookup):
+        """
+        Рецепты из связи пользователя: id берем из кэша связей,
+        если их немного, иначе соединяем с таблицей связи.
+        """
+        relations = get_relations(self.request)
+        if not value or relations is None:
+            return queryset
+        ids = relations.get(kind)
+        if ids is not None and len(ids) <= FILTER_MAX_IDS:
+            return queryset.filter(id__in=list(ids))
+        return queryset.filter(**{lookup: self.request.user})
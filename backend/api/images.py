@@ -0,0 +1,142 @@
+"""
+Картинки рецептов: декодирование, проверка, хранение и варианты.
+
+В запросе data URI декодируется порциями во временный файл, по
+заголовку проверяется формат и размер в пикселях, оригинал
+сохраняется хранилищем ContentAddressedStorage под именем из SHA-256
+содержимого (одинаковые файлы хранятся один раз). Полное
+декодирование, превью и WebP строит manage.py image_worker по очереди
+ImageJob.
+"""
+import base64
+import binascii
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from recipes.models import ImageJob, Recipe
+from recipes.storage import sharded
+
+IMAGE_DIR = 'recipes/images/'
+VARIANTS_DIR = 'recipes/images/variants/'
+# Формат Pillow - расширение файла.
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# Порция base64 декодируется отдельно.
+DECODE_CHUNK_SIZE = 4 * 256 * 1024
+STORAGE = Recipe._meta.get_field('image').storage
+
+
+def decode_base64(data):
+    """
+    Data URI во временный файл на диске, без полной копии в памяти.
+    ValueError - не base64 или файл больше IMAGE_MAX_SIZE.
+    """
+    header, _, encoded = data.partition(';base64,')
+    if len(encoded) // 4 * 3 > settings.IMAGE_MAX_SIZE:
+        raise ValueError('Слишком большой файл.')
+    file = TemporaryUploadedFile(
+        'image.' + header.split('/')[-1], header[len('data:'):], 0, None
+    )
+    try:
+        # Переносы строк и пробелы (MIME) выбрасываем, остаток порции
+        # не кратный 4 переходит в следующую.
+        rest = ''
+        for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+            chunk = rest + ''.join(
+                encoded[start:start + DECODE_CHUNK_SIZE].split()
+            )
+            size = len(chunk) // 4 * 4
+            file.write(base64.b64decode(chunk[:size], validate=True))
+            rest = chunk[size:]
+        file.write(base64.b64decode(rest, validate=True))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise ValueError('Некорректный base64.')
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
+
+def identify(file):
+    """Формат картинки по заголовку; ValueError - не картинка."""
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('Не картинка.')
+    finally:
+        file.seek(0)
+    if image_format not in FORMATS:
+        raise ValueError(f'Формат {image_format} не поддерживается.')
+    return image_format
+
+
+def save_original(file):
+    """Сохраняем оригинал под именем из SHA-256, вернем имя файла."""
+    return STORAGE.save(f'{IMAGE_DIR}image.{FORMATS[identify(file)]}', file)
+
+
+def request_variants(image):
+    """
+    Ставим картинку в очередь image_worker. Если варианты уже
+    построены (та же картинка у другого рецепта), берем готовые.
+    """
+    job, _ = ImageJob.objects.get_or_create(image=image)
+    if job.status == ImageJob.DONE:
+        # Свежий updated: gc_media не удалит задачу и ее варианты.
+        ImageJob.objects.filter(id=job.id).update(updated=timezone.now())
+        Recipe.objects.filter(image=image).update(image_variants=job.variants)
+
+
+def save_variant(image, name, image_format):
+    if default_storage.exists(name):
+        return name
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    content = BytesIO()
+    image.save(content, image_format, **settings.IMAGE_SAVE_OPTIONS.get(
+        image_format, {}
+    ))
+    return default_storage.save(name, ContentFile(content.getvalue()))
+
+
+def make_variants(name):
+    """
+    Превью по IMAGE_VARIANTS (в формате оригинала и WebP) и WebP
+    в полном размере. Имена - из SHA-256 оригинала и размера, поэтому
+    повторная обработка файлы не дублирует.
+    """
+    stem = name.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+    directory = sharded(VARIANTS_DIR, stem, '')
+    with STORAGE.open(name) as file, Image.open(file) as image:
+        image_format = image.format
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    variants = {
+        'webp': save_variant(image, f'{directory}{stem}.webp', 'WEBP')
+    }
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size))
+        prefix = f'{directory}{stem}_{size}'
+        variants[variant] = save_variant(
+            thumbnail, f'{prefix}.{FORMATS[image_format]}', image_format
+        )
+        variants[f'{variant}_webp'] = save_variant(
+            thumbnail, f'{prefix}.webp', 'WEBP'
+        )
+    return variants
+
+
+def run_job(job):
+    variants = make_variants(job.image)
+    with transaction.atomic():
+        job.variants = variants
+        job.status = ImageJob.DONE
+        job.save(update_fields=('variants', 'status', 'updated'))
+        Recipe.objects.filter(image=job.image).update(image_variants=variants)
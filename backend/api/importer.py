@@ -0,0 +1,255 @@
+"""
+Пакетный импорт рецептов из NDJSON (один рецепт в строке).
+
+Строка - JSON-объект:
+    {"name": "...", "text": "...", "cooking_time": 10,
+     "tags": ["breakfast", 2],
+     "ingredients": [{"id": 1, "amount": 10},
+                     {"name": "соль", "measurement_unit": "г", "amount": 5}],
+     "image": "data:image/png;base64,..."}
+Теги задаются slug или id, ингредиенты - id или названием
+с единицей измерения, картинка необязательна.
+"""
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag, User,
+                            tags_mask)
+from recipes.signals import recipes_changed
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from .feed import fan_out
+from .images import request_variants
+from .serializers import (CreateUpdateRecipeSerializer,
+                          RecipeIngredientSerializer)
+
+# Поля рецепта, которые проверяются полями сериализатора API.
+FIELDS = ('name', 'text', 'cooking_time')
+
+
+class RowError(ValueError):
+    """Ошибки одной строки: {поле: [сообщения]}."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def chunked(iterable, size):
+    if size < 1:
+        raise ValueError('Размер пачки - не меньше 1.')
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def messages(error):
+    return [str(detail) for detail in error.detail]
+
+
+class RecipeImporter:
+    """
+    Импорт рецептов пачками.
+
+    Поля проверяются полями и правилами CreateUpdateRecipeSerializer,
+    теги и ингредиенты сверяются со справочниками в памяти, каждая
+    пачка записывается тремя bulk_create в одной транзакции.
+    """
+
+    def __init__(self, author, chunk_size=None):
+        self.author = author
+        self.chunk_size = (
+            settings.IMPORT_CHUNK_SIZE if chunk_size is None else chunk_size
+        )
+        if not 1 <= self.chunk_size <= settings.IMPORT_MAX_CHUNK_SIZE:
+            raise ValueError(
+                f'Размер пачки - от 1 до {settings.IMPORT_MAX_CHUNK_SIZE}.'
+            )
+        self.serializer = CreateUpdateRecipeSerializer()
+        self.ingredient_fields = RecipeIngredientSerializer().fields
+        self.tags = {}
+        self.tag_bits = {}
+        for tag_id, slug, bit in Tag.objects.values_list('id', 'slug', 'bit'):
+            self.tags[slug] = self.tags[tag_id] = tag_id
+            self.tag_bits[tag_id] = bit
+        self.ingredient_ids = set()
+        self.ingredients = {}
+        for ingredient_id, name, measurement_unit in (
+            Ingredient.objects.order_by().values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        ):
+            self.ingredient_ids.add(ingredient_id)
+            self.ingredients[name.lower(), measurement_unit.lower()] = (
+                ingredient_id
+            )
+        self.created = 0
+        self.errors = []
+
+    @property
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def run(self, lines):
+        """Импортируем строки, возвращаем отчет."""
+        rows = (
+            (number, line) for number, line in enumerate(lines, 1)
+            if line.strip()
+        )
+        for chunk in chunked(rows, self.chunk_size):
+            self.save(self.validate(chunk))
+        return self.report
+
+    def validate(self, chunk):
+        valid = []
+        for number, line in chunk:
+            try:
+                valid.append(self.clean(json.loads(line)))
+            except RowError as error:
+                self.errors.append({'line': number, 'errors': error.errors})
+            except ValueError as error:
+                self.errors.append(
+                    {'line': number, 'errors': {'json': [str(error)]}}
+                )
+        return valid
+
+    def clean(self, data):
+        """Проверяем строку теми же правилами, что и API рецептов."""
+        if not isinstance(data, dict):
+            raise RowError({'json': ['Ожидается объект.']})
+        errors = {}
+        values = {}
+        for name in FIELDS:
+            try:
+                values[name] = self.serializer.fields[name].run_validation(
+                    data.get(name, empty)
+                )
+            except serializers.ValidationError as error:
+                errors[name] = messages(error)
+        tags = self.clean_tags(data.get('tags'), errors)
+        amounts = self.clean_ingredients(data.get('ingredients'), errors)
+        image = None
+        if data.get('image') and not errors:
+            try:
+                image = self.serializer.fields['image'].run_validation(
+                    data['image']
+                )
+            except serializers.ValidationError as error:
+                errors['image'] = messages(error)
+        if errors:
+            raise RowError(errors)
+        return (
+            Recipe(
+                author=self.author, image=image,
+                tags_mask=tags_mask(self.tag_bits[tag] for tag in tags),
+                **values
+            ),
+            tags,
+            amounts
+        )
+
+    def clean_tags(self, value, errors):
+        if not isinstance(value, list):
+            value = []
+        tags, unknown = [], []
+        for tag in value:
+            if not isinstance(tag, (int, str)) or tag not in self.tags:
+                unknown.append(f'{tag} - тега не существует.')
+            else:
+                tags.append(self.tags[tag])
+        if unknown:
+            errors['tags'] = unknown
+            return ()
+        try:
+            return self.serializer.validate_tags(tags)
+        except serializers.ValidationError as error:
+            errors['tags'] = messages(error)
+            return ()
+
+    def clean_ingredients(self, value, errors):
+        """
+        Ингредиент задается id или названием с единицей измерения;
+        ненайденное название остается в списке как есть, и общая
+        проверка сообщит, что такого ингредиента нет.
+        """
+        if not isinstance(value, list):
+            value = []
+        items, item_errors = [], []
+        for item in value:
+            if not isinstance(item, dict):
+                item_errors.append(f'{item} - ожидается объект.')
+                continue
+            try:
+                if 'id' in item:
+                    ingredient = self.ingredient_fields['id'].run_validation(
+                        item['id']
+                    )
+                else:
+                    ingredient = self.ingredients.get((
+                        str(item.get('name', '')).lower(),
+                        str(item.get('measurement_unit', '')).lower()
+                    ), item.get('name'))
+                amount = self.ingredient_fields['amount'].run_validation(
+                    item.get('amount', 1)
+                )
+            except serializers.ValidationError as error:
+                item_errors.extend(
+                    f'{item.get("id", item.get("name"))}: {message}'
+                    for message in messages(error)
+                )
+                continue
+            items.append({'id': ingredient, 'amount': amount})
+        if not item_errors:
+            try:
+                self.serializer.check_ingredients(
+                    items, lambda ids: self.ingredient_ids
+                )
+            except serializers.ValidationError as error:
+                item_errors = messages(error)
+        if item_errors:
+            errors['ingredients'] = item_errors
+            return {}
+        return {item['id']: item['amount'] for item in items}
+
+    @transaction.atomic
+    def save(self, valid):
+        if not valid:
+            return
+        recipes = [recipe for recipe, _, _ in valid]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+            User.objects.filter(id=self.author.id).update(
+                recipes_count=F('recipes_count') + len(recipes)
+            )
+            fan_out(self.author.id, recipes)
+            for image in {recipe.image.name for recipe in recipes}:
+                if image:
+                    transaction.on_commit(
+                        lambda image=image: request_variants(image)
+                    )
+        else:
+            for recipe in recipes:
+                recipe.save()
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag)
+            for recipe, tags, _ in valid for tag in tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe.id, ingredient_id=ingredient, amount=amount
+            )
+            for recipe, _, amounts in valid
+            for ingredient, amount in amounts.items()
+        )
+        recipes_changed.send(
+            sender=Recipe, recipe_ids=[recipe.id for recipe in recipes]
+        )
+        self.created += len(recipes)
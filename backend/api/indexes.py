@@ -0,0 +1,143 @@
+"""
+Индексы в памяти процесса для быстрого поиска без запросов к БД.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from recipes.models import Ingredient
+
+from .cache import get_version
+
+# Минимальная доля общих триграмм для нечеткого совпадения.
+FUZZY_THRESHOLD = 0.3
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е').strip()
+
+
+def trigrams(value):
+    """Триграммы слов строки, как в pg_trgm."""
+    return {
+        padded[index:index + 3]
+        for word in value.split()
+        for padded in (f'  {word} ',)
+        for index in range(len(padded) - 2)
+    }
+
+
+class IngredientIndex:
+    """
+    Поиск ингредиентов по началу названия и с опечатками.
+
+    Названия хранятся в отсортированном списке (поиск по префиксу
+    бинарным поиском) и в индексе триграмм (нечеткий поиск).
+    Строится из БД при первом обращении. Версия справочника в общем
+    кэше сверяется при каждом обращении: после коммита изменения
+    ингредиентов (в любом процессе) она новая, и индекс
+    перестраивается.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self.version = None
+
+    def build(self):
+        with self._lock:
+            self.version, _ = get_version(Ingredient._meta.db_table)
+            self.items = {}
+            self.entries = {}
+            self.keys = []
+            self.trigrams = defaultdict(set)
+            for ingredient_id, name, measurement_unit in (
+                Ingredient.objects.order_by().values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            ):
+                self.keys.append(
+                    self._add(ingredient_id, name, measurement_unit)
+                )
+            self.keys.sort()
+            self._built = True
+
+    def reset(self):
+        """Индекс будет перестроен при следующем обращении."""
+        with self._lock:
+            self._built = False
+
+    def ensure_built(self):
+        if (
+            not self._built
+            or get_version(Ingredient._meta.db_table)[0] != self.version
+        ):
+            self.build()
+
+    def all(self):
+        self.ensure_built()
+        return [self.items[ingredient_id] for _, ingredient_id in self.keys]
+
+    def search(self, query, limit=None):
+        """
+        Ингредиенты по запросу: сначала совпадения по началу названия
+        (по алфавиту), затем похожие по триграммам (по убыванию сходства).
+        """
+        self.ensure_built()
+        query = normalize(query)
+        if not query:
+            return self.all()[:limit]
+        with self._lock:
+            found = self._prefix(query, limit)
+            if limit is None or len(found) < limit:
+                seen = set(found)
+                found += [
+                    ingredient_id for ingredient_id in self._fuzzy(query)
+                    if ingredient_id not in seen
+                ]
+            return [self.items[ingredient_id] for ingredient_id in found][
+                :limit
+            ]
+
+    def _prefix(self, query, limit):
+        found = []
+        index = bisect_left(self.keys, (query,))
+        while index < len(self.keys) and self.keys[index][0].startswith(
+            query
+        ):
+            found.append(self.keys[index][1])
+            if limit is not None and len(found) >= limit:
+                break
+            index += 1
+        return found
+
+    def _fuzzy(self, query):
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return []
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+        scored = []
+        for ingredient_id, count in shared.items():
+            key, item_trigrams = self.entries[ingredient_id]
+            score = count / (len(query_trigrams) + len(item_trigrams) - count)
+            if score >= FUZZY_THRESHOLD:
+                scored.append((-score, key, ingredient_id))
+        return [ingredient_id for _, _, ingredient_id in sorted(scored)]
+
+    def _add(self, ingredient_id, name, measurement_unit):
+        key = normalize(name)
+        item_trigrams = trigrams(key)
+        self.items[ingredient_id] = {
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': measurement_unit,
+        }
+        self.entries[ingredient_id] = (key, item_trigrams)
+        for trigram in item_trigrams:
+            self.trigrams[trigram].add(ingredient_id)
+        return (key, ingredient_id)
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,114 @@
+"""
+Проверка планов горячих запросов: каждый должен идти по индексу.
+"""
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingList, Subscription,
+                            TimelineEntry, User)
+
+from api.pagination import after
+
+# SQLite: "SCAN table" без индекса; PostgreSQL: "Seq Scan on table".
+SEQUENTIAL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+
+def hot_queries():
+    """Запросы API, которые не должны читать таблицы целиком."""
+    ordering = ('-pub_date', '-id')
+    return {
+        'лента рецептов': Recipe.objects.order_by(*ordering)[:7],
+        'лента по курсору': Recipe.objects.filter(
+            after(ordering, (timezone.now(), 1))
+        ).order_by(*ordering)[:7],
+        'рецепты автора': Recipe.objects.filter(
+            author_id=1
+        ).order_by(*ordering)[:7],
+        'фильтр по тегу': Recipe.objects.with_tags((0,)).order_by(
+            *ordering
+        )[:7],
+        'фильтр по всем тегам': Recipe.objects.with_tags(
+            (0, 1), match_all=True
+        ).order_by(*ordering)[:7],
+        'ингредиенты по началу названия': (
+            Ingredient.objects.name_prefix('мол')[:10]
+        ),
+        'рецепт в избранном': Favorite.objects.filter(
+            user_id=1, recipe_id=1
+        ),
+        'рецепт в корзине': Cart.objects.filter(user_id=1, recipe_id=1),
+        'избранное пользователя': Recipe.objects.filter(
+            recipes_favorite__user_id=1
+        ).order_by(*ordering)[:7],
+        'подписки': User.objects.filter(subscribing__user_id=1)[:7],
+        'лента подписок': TimelineEntry.objects.filter(user_id=1).order_by(
+            '-pub_date', '-recipe_id'
+        ).values_list('pub_date', 'recipe_id')[:7],
+        'авторы ленты с чтением при запросе': User.objects.filter(
+            subscribing__user_id=1, feed_on_read=True
+        ),
+        'подписка на автора': Subscription.objects.filter(
+            user_id=1, author_id=2
+        ),
+        'список покупок': ShoppingList.objects.filter(user_id=1),
+        'список покупок по корзине': RecipeIngredient.objects.filter(
+            recipe__recipes_cart__user_id=1
+        ).order_by().values('ingredient').annotate(amount=Sum('amount')),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для горячих запросов API и завершается '
+        'с ошибкой, если какой-то из них читает таблицу целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Вывести планы всех запросов.'
+        )
+
+    def handle(self, *args, verbose_plans=False, **options):
+        pattern = SEQUENTIAL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'Не поддерживается: {connection.vendor}.')
+        failed = []
+        for name, queryset in hot_queries().items():
+            plan = self.explain(queryset)
+            scans = pattern.findall(plan)
+            if scans:
+                failed.append(name)
+            if scans or verbose_plans:
+                self.stdout.write(f'{name}:\n{plan}\n')
+            if scans:
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: полный просмотр {", ".join(scans)}'
+                ))
+        if failed:
+            raise CommandError(
+                f'Без индекса: {len(failed)} из {len(hot_queries())}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Все горячие запросы идут по индексам.'
+        ))
+
+    @staticmethod
+    def explain(queryset):
+        """
+        План запроса. В PostgreSQL полный просмотр запрещаем: на
+        маленькой таблице он дешевле, но нужен ответ, есть ли индекс.
+        """
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
@@ -0,0 +1,58 @@
+"""
+Обработчики фоновой выгрузки списков покупок.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import ExportJob
+
+from api.utils import render_shopping_list
+from api.workers import run_pool
+
+
+def run_job(job):
+    content = render_shopping_list(job.user_id, job.file_format)
+    job.file.save(
+        f'{job.id}.{job.file_format}', ContentFile(content), save=False
+    )
+    job.status = ExportJob.DONE
+    job.save(update_fields=('file', 'status', 'updated'))
+
+
+def delete_expired():
+    for job in ExportJob.objects.filter(
+        updated__lt=timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TTL)
+    ).exclude(status=ExportJob.RUNNING):
+        job.file.delete(save=False)
+        job.delete()
+
+
+def maintain():
+    ExportJob.objects.requeue(timedelta(seconds=settings.EXPORT_JOB_TIMEOUT))
+    delete_expired()
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает пул обработчиков фоновой выгрузки списков покупок. '
+        'Очередь хранится в БД, внешний брокер не нужен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.EXPORT_WORKERS,
+            help='Число процессов-обработчиков.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать очередь и завершиться.'
+        )
+
+    def handle(self, *args, workers, once, **options):
+        run_pool(
+            self, ExportJob, run_job, workers,
+            settings.EXPORT_POLL_INTERVAL, once, maintain
+        )
@@ -0,0 +1,137 @@
+"""
+Удаление файлов картинок рецептов, на которые нет ссылок в БД.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from recipes.models import ImageJob, Recipe
+
+from api.images import IMAGE_DIR, STORAGE
+from api.importer import chunked
+
+FETCH_SIZE = 10000
+MB = 1024 * 1024
+
+
+def digest(name):
+    """64 бита blake2b имени файла."""
+    return int.from_bytes(
+        hashlib.blake2b(name.encode(), digest_size=8).digest(), 'little'
+    )
+
+
+def referenced_names(jobs):
+    """Картинки рецептов, их варианты и файлы задач `jobs`."""
+    recipes = Recipe.objects.exclude(image='').exclude(image=None)
+    for queryset, variants in (
+        (recipes, 'image_variants'), (jobs, 'variants')
+    ):
+        for name, names in queryset.order_by().values_list(
+            'image', variants
+        ).iterator(chunk_size=FETCH_SIZE):
+            yield name
+            yield from names.values()
+
+
+def unreferenced(files, references):
+    """Файлы, хешей имен которых нет в отсортированном `references`."""
+    if not len(references):
+        return files
+    digests = np.fromiter(
+        (digest(name) for name, _, _ in files), dtype=np.uint64,
+        count=len(files)
+    )
+    found = references[np.minimum(
+        np.searchsorted(references, digests), len(references) - 1
+    )] == digests
+    return [file for file, hit in zip(files, found.tolist()) if not hit]
+
+
+def media_files(root):
+    """(имя, размер, mtime) файлов под `root`, каталог за каталогом."""
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            name = os.path.relpath(path, STORAGE.location)
+            yield name.replace(os.sep, '/'), stat.st_size, stat.st_mtime
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы из MEDIA_ROOT/recipes/images/, на которые не '
+        'ссылаются рецепты (картинка и ее варианты) и задачи '
+        'image_worker, и задачи картинок без рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удалять.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help=(
+                'Не трогать файлы и задачи моложе стольких секунд: '
+                'картинка может быть сохранена раньше рецепта.'
+            )
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, dry_run, min_age, batch_size, **options):
+        if min_age < 0 or batch_size < 1:
+            raise CommandError('--min-age >= 0, --batch-size >= 1.')
+        started = time.monotonic()
+        cutoff = time.time() - min_age
+        orphans = ImageJob.objects.filter(
+            updated__lt=datetime.fromtimestamp(cutoff, timezone.utc)
+        ).exclude(status=ImageJob.RUNNING).exclude(
+            Exists(Recipe.objects.filter(image=OuterRef('image')))
+        )
+        if dry_run:
+            jobs = orphans.count()
+        else:
+            jobs, _ = orphans.delete()
+        # Ссылки - отсортированный массив 64-битных хешей имен: память
+        # 8 байт на ссылку. Совпадение хешей только сохранит лишний файл.
+        references = np.unique(np.fromiter(
+            map(digest, referenced_names(
+                ImageJob.objects.exclude(id__in=orphans.values('id'))
+            )), dtype=np.uint64
+        ))
+        scanned = scanned_size = skipped = deleted = deleted_size = 0
+        for batch in chunked(
+            media_files(STORAGE.path(IMAGE_DIR)), batch_size
+        ):
+            scanned += len(batch)
+            scanned_size += sum(size for _, size, _ in batch)
+            old = [file for file in batch if file[2] < cutoff]
+            skipped += len(batch) - len(old)
+            for name, size, _ in unreferenced(old, references):
+                if not dry_run:
+                    STORAGE.delete(name)
+                deleted += 1
+                deleted_size += size
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'Просмотрено: {scanned}, без ссылок: {deleted}.'
+                )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Просмотрено файлов: {scanned} ({scanned_size / MB:.1f} МБ) '
+            f'за {elapsed:.1f} с: {scanned / elapsed:.0f} файлов/с, '
+            f'{scanned_size / MB / elapsed:.1f} МБ/с. '
+            f'Моложе --min-age: {skipped}.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Будет удалено" if dry_run else "Удалено"} файлов: '
+            f'{deleted} ({deleted_size / MB:.1f} МБ), задач картинок: {jobs}.'
+        ))
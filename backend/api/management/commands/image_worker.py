@@ -0,0 +1,38 @@
+"""
+Обработчики картинок рецептов: превью и WebP.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.models import ImageJob
+
+from api.images import run_job
+from api.workers import run_pool
+
+
+def maintain():
+    ImageJob.objects.requeue(timedelta(seconds=settings.IMAGE_JOB_TIMEOUT))
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает пул обработчиков картинок рецептов: строит превью '
+        'и WebP-варианты по очереди в БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.IMAGE_WORKERS,
+            help='Число процессов-обработчиков.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать очередь и завершиться.'
+        )
+
+    def handle(self, *args, workers, once, **options):
+        run_pool(
+            self, ImageJob, run_job, workers,
+            settings.IMAGE_POLL_INTERVAL, once, maintain
+        )
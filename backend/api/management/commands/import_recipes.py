@@ -0,0 +1,57 @@
+"""
+Пакетный импорт рецептов из NDJSON-файла.
+"""
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import User
+
+from api.importer import RecipeImporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует рецепты из NDJSON (один JSON-рецепт в строке). '
+        'Формат строки описан в api/importer.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON, "-" - stdin.')
+        parser.add_argument(
+            '--author', required=True, help='email автора рецептов.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument(
+            '--report', help='Куда сохранить отчет в JSON.'
+        )
+
+    def handle(self, *args, path, author, chunk_size, report, **options):
+        try:
+            author = User.objects.get(email=author)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {author} не найден.')
+        try:
+            importer = RecipeImporter(author, chunk_size=chunk_size)
+        except ValueError as error:
+            raise CommandError(error)
+        start = time.perf_counter()
+        if path == '-':
+            result = importer.run(sys.stdin)
+        else:
+            with open(path, encoding='utf-8') as file:
+                result = importer.run(file)
+        elapsed = time.perf_counter() - start
+        for error in result['errors']:
+            self.stderr.write(
+                f'Строка {error["line"]}: '
+                f'{json.dumps(error["errors"], ensure_ascii=False)}'
+            )
+        if report:
+            with open(report, 'w', encoding='utf-8') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано {result["created"]}, с ошибками {result["failed"]}, '
+            f'{result["created"] / max(elapsed, 1e-9):.0f} рецептов/с.'
+        ))
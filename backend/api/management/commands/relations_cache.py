@@ -0,0 +1,43 @@
+"""
+Размер кэша связей пользователей.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recipes.models import User
+
+from api.relations import KINDS, UserRelations
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько id и байт занимают в кэше связи '
+        'пользователей (избранное, корзина, подписки).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя (можно указать несколько раз).'
+        )
+
+    def handle(self, *args, users=None, **options):
+        if not users:
+            users = User.objects.values_list('id', flat=True)
+        total = 0
+        for user_id in users:
+            relations = UserRelations(user_id)
+            counts = []
+            for kind in KINDS:
+                ids = relations.get(kind)
+                counts.append(
+                    f'{kind}={"не кэшируется" if ids is None else len(ids)}'
+                )
+            total += relations.nbytes
+            self.stdout.write(
+                f'user={user_id}: {", ".join(counts)}, '
+                f'{relations.nbytes} байт'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {total} байт, предел на пользователя '
+            f'{len(KINDS) * settings.RELATIONS_CACHE_MAX_IDS * 8} байт.'
+        ))
@@ -0,0 +1,19 @@
+"""
+Обрезка лент подписок до FEED_MAX_LENGTH записей.
+"""
+from django.core.management.base import BaseCommand
+
+from api.feed import trim_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из лент подписок записи сверх FEED_MAX_LENGTH. '
+        'Ленты обрезаются и при раскладке рецептов и подписке, '
+        'команда подчищает остальное.'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей: {trim_feeds()}.'
+        ))
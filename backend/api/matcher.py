@@ -0,0 +1,212 @@
+"""
+Подбор рецептов по имеющимся ингредиентам (?have=) в памяти процесса.
+"""
+import threading
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from django.db.models import Max
+from django.utils import timezone
+from recipes.models import RecipeChange, RecipeIngredient
+from recipes.search import chunks
+
+# Сколько хранится журнал; индекс, не догонявший его дольше половины
+# этого срока, строится заново.
+CHANGES_TIMEOUT = timedelta(hours=1)
+# Id записей журнала выдаются до коммита: запись с меньшим id может
+# появиться позже соседней. Пропуск в id моложе GAP_TIMEOUT ждем,
+# старше - считаем откатом.
+GAP_TIMEOUT = timedelta(seconds=10)
+# Сколько записей журнала догонять, дальше индекс строится заново.
+MAX_CHANGES = 1000
+# Старые записи журнала удаляются при каждой TRIM_INTERVAL-й записи.
+TRIM_INTERVAL = 100
+FETCH_SIZE = 100000
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def load():
+    """Все пары (рецепт, ингредиент) из БД двумя массивами."""
+    pairs = np.fromiter(chain.from_iterable(
+        RecipeIngredient.objects.order_by().values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator(chunk_size=FETCH_SIZE)
+    ), dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def record_change(recipe_ids):
+    """Состав рецептов `recipe_ids` изменился: запись в журнал в БД."""
+    change = RecipeChange.objects.create(recipe_ids=list(recipe_ids))
+    if change.id % TRIM_INTERVAL == 0:
+        RecipeChange.objects.filter(
+            created__lt=change.created - CHANGES_TIMEOUT
+        ).delete()
+
+
+class RecipeMatcher:
+    """
+    Инвертированный индекс: ингредиент - отсортированный массив id
+    рецептов с ним. Массивы ингредиентов из ?have= склеиваются,
+    bincount дает число совпавших ингредиентов каждого рецепта,
+    покрытие - их доля среди всех ингредиентов рецепта.
+
+    Строится из БД при первом обращении. Записи рецептов попадают
+    в журнал в БД (RecipeChange), при обращении индекс догоняет
+    журнал, перечитывая из БД только эти рецепты. Версия индекса -
+    id последней учтенной записи журнала.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.synced = None
+
+    def build(self):
+        with self._lock:
+            # Версию берем до чтения и с запасом GAP_TIMEOUT: более
+            # поздние записи догоним по журналу, перечитать рецепт
+            # лишний раз не страшно.
+            self.synced = timezone.now()
+            self.version = RecipeChange.objects.filter(
+                created__lt=self.synced - GAP_TIMEOUT
+            ).aggregate(version=Max('id'))['version'] or 0
+            self.fill(*load())
+
+    def fill(self, recipes, ingredients):
+        """Индекс из массивов пар (рецепт, ингредиент)."""
+        with self._lock:
+            size = int(recipes.max()) + 1 if len(recipes) else 0
+            self.counts = np.bincount(recipes, minlength=size).astype(
+                np.int32
+            )
+            # Ингредиенты рецептов подряд: прежний состав при изменении.
+            order = np.lexsort((ingredients, recipes))
+            self.forward = ingredients[order].astype(np.int32)
+            self.offsets = np.concatenate(([0], np.cumsum(self.counts)))
+            self.changed = {}
+            order = np.lexsort((recipes, ingredients))
+            recipes, ingredients = recipes[order], ingredients[order]
+            bounds = np.flatnonzero(np.diff(ingredients)) + 1
+            self.postings = {
+                int(ingredients[start]): posting
+                for start, posting in zip(
+                    np.concatenate(([0], bounds)),
+                    np.split(recipes, bounds)
+                )
+            } if len(ingredients) else {}
+
+    def sync(self):
+        with self._lock:
+            now = timezone.now()
+            if (
+                self.version is None
+                or now - self.synced > CHANGES_TIMEOUT / 2
+            ):
+                return self.build()
+            changes = list(
+                RecipeChange.objects.filter(id__gt=self.version)
+                .order_by('id').values_list('id', 'recipe_ids', 'created')
+                [:MAX_CHANGES + 1]
+            )
+            if len(changes) > MAX_CHANGES:
+                return self.build()
+            self.synced = now
+            if not changes:
+                return
+            # Версия растет до первого свежего пропуска: записи после
+            # него перечитаем и в следующий раз.
+            version = self.version
+            for change_id, _, created in changes:
+                if change_id != version + 1 and now - created < GAP_TIMEOUT:
+                    break
+                version = change_id
+            self.reload({
+                recipe_id for _, recipe_ids, _ in changes
+                for recipe_id in recipe_ids
+            })
+            self.version = version
+
+    def reload(self, recipe_ids):
+        """Перечитываем из БД состав рецептов `recipe_ids`."""
+        for ids in chunks(recipe_ids):
+            found = {recipe_id: [] for recipe_id in ids}
+            for recipe_id, ingredient_id in (
+                RecipeIngredient.objects.filter(recipe_id__in=ids)
+                .order_by().values_list('recipe_id', 'ingredient_id')
+            ):
+                found[recipe_id].append(ingredient_id)
+            for recipe_id, ingredients in found.items():
+                self.set(recipe_id, ingredients)
+
+    def ingredients(self, recipe_id):
+        if recipe_id in self.changed:
+            return self.changed[recipe_id]
+        if recipe_id + 1 < len(self.offsets):
+            return self.forward[
+                self.offsets[recipe_id]:self.offsets[recipe_id + 1]
+            ]
+        return EMPTY
+
+    def set(self, recipe_id, ingredients):
+        """Новый состав рецепта (пустой - рецепт удален)."""
+        with self._lock:
+            ingredients = np.unique(np.asarray(ingredients, dtype=np.int32))
+            old = self.ingredients(recipe_id)
+            for ingredient in np.setdiff1d(old, ingredients).tolist():
+                posting = self.postings[ingredient]
+                index = np.searchsorted(posting, recipe_id)
+                if index < len(posting) and posting[index] == recipe_id:
+                    self.postings[ingredient] = np.delete(posting, index)
+            for ingredient in np.setdiff1d(ingredients, old).tolist():
+                posting = self.postings.get(ingredient, EMPTY)
+                self.postings[ingredient] = np.insert(
+                    posting, np.searchsorted(posting, recipe_id), recipe_id
+                )
+            if recipe_id >= len(self.counts):
+                self.counts = np.concatenate((self.counts, np.zeros(
+                    max(recipe_id + 1 - len(self.counts), len(self.counts)),
+                    dtype=np.int32
+                )))
+            self.counts[recipe_id] = len(ingredients)
+            self.changed[recipe_id] = ingredients
+
+    def match(self, have, max_missing=None, limit=None):
+        """
+        Id рецептов, где есть хотя бы один ингредиент из `have`, и их
+        покрытие: по убыванию покрытия, затем новые. `max_missing` -
+        сколько ингредиентов рецепта может не хватать.
+        """
+        self.sync()
+        with self._lock:
+            postings = [
+                self.postings[ingredient] for ingredient in set(have)
+                if ingredient in self.postings
+            ]
+            if not postings:
+                return EMPTY, np.empty(0)
+            matched = np.bincount(
+                np.concatenate(postings), minlength=len(self.counts)
+            )
+            ids = np.flatnonzero(matched)
+            matched, total = matched[ids], self.counts[ids]
+        if max_missing is not None:
+            enough = total - matched <= max_missing
+            ids, matched, total = ids[enough], matched[enough], total[enough]
+        coverage = matched / total
+        if limit is not None and len(ids) > limit:
+            # Лучшие `limit` без полной сортировки: выше порога и самые
+            # новые из равных порогу (ids уже по возрастанию).
+            threshold = np.partition(coverage, len(ids) - limit)[
+                len(ids) - limit
+            ]
+            above = np.flatnonzero(coverage > threshold)
+            equal = np.flatnonzero(coverage == threshold)
+            keep = np.concatenate((above, equal[len(above) - limit:]))
+            ids, coverage = ids[keep], coverage[keep]
+        order = np.lexsort((-ids, -coverage))[:limit]
+        return ids[order], coverage[order]
+
+
+recipe_matcher = RecipeMatcher()
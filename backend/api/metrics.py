@@ -0,0 +1,191 @@
+"""
+Метрики запросов в памяти процесса: гистограммы по представлениям.
+
+MetricsMiddleware на каждый запрос собирает RequestSample (запросы
+к БД, их время, время представления и рендеринга) и пишет его
+в `registry`,
+/api/_metrics отдает гистограммы в текстовом формате Prometheus.
+У каждого процесса gunicorn свои метрики (метка `pid`).
+"""
+import os
+import threading
+from time import perf_counter
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+# Значащих бит в корзине: относительная погрешность не больше 1/64.
+SIGNIFICANT_BITS = 7
+MICROSECONDS = 1000000
+
+# Метрика: (описание, единица на выходе - делитель записанного int).
+METRICS = {
+    'request_duration_seconds': ('Время ответа.', MICROSECONDS),
+    'request_queries': ('Запросов к БД за ответ.', 1),
+    'request_db_duration_seconds': ('Время запросов к БД.', MICROSECONDS),
+    'request_view_duration_seconds': (
+        'Время представления: проверка, запись и сериализация данных, '
+        'с запросами к БД.',
+        MICROSECONDS
+    ),
+    'request_render_duration_seconds': (
+        'Время рендеринга ответа DRF.', MICROSECONDS
+    ),
+    'response_size_bytes': ('Размер тела ответа.', 1),
+}
+
+
+class Histogram:
+    """
+    Гистограмма в духе HdrHistogram: корзины лог-линейные, в каждой
+    степени двойки 2 ** (SIGNIFICANT_BITS - 1) корзин одной ширины.
+    Память - только непустые корзины, запись - O(1).
+    """
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = self.total = self.max = 0
+
+    def record(self, value):
+        shift = max(value.bit_length() - SIGNIFICANT_BITS, 0)
+        key = shift << SIGNIFICANT_BITS | value >> shift
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, quantile):
+        """Верхняя граница корзины, где лежит квантиль (не больше max)."""
+        rank = quantile * self.count
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= rank:
+                shift = key >> SIGNIFICANT_BITS
+                low = key & ((1 << SIGNIFICANT_BITS) - 1)
+                return min(((low + 1) << shift) - 1, self.max)
+        return self.max
+
+
+class RequestSample:
+    """
+    Счетчики одного запроса; сам же - обертка connection.execute_wrapper.
+    SQL с одинаковым текстом (параметры отдельно) суммируются: повтор
+    одного запроса N раз виден в логе медленных запросов одной строкой.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}
+        # Отметки хуков промежуточного слоя: вызов представления
+        # (process_view) и его ответ до рендеринга
+        # (process_template_response).
+        self.view_started = None
+        self.view_finished = None
+        self.view_time = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            statement = self.statements.get(sql)
+            if statement is None:
+                self.statements[sql] = [1, elapsed]
+            else:
+                statement[0] += 1
+                statement[1] += elapsed
+
+    def finish(self):
+        """Ответ готов: время представления и рендеринга по отметкам."""
+        end = perf_counter()
+        if self.view_started is None:
+            return
+        if self.view_finished is None:
+            self.view_time = end - self.view_started
+            return
+        self.view_time = self.view_finished - self.view_started
+        self.render_time = end - self.view_finished
+
+    def worst(self, limit):
+        """(SQL, число, суммарное время) по убыванию времени."""
+        return sorted(
+            ((sql, count, elapsed)
+             for sql, (count, elapsed) in self.statements.items()),
+            key=lambda statement: statement[2], reverse=True
+        )[:limit]
+
+
+class Registry:
+    """Гистограммы по (представление, метод)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+
+    def record(self, view, method, duration, sample, size):
+        values = {
+            'request_duration_seconds': duration,
+            'request_queries': sample.queries,
+            'request_db_duration_seconds': sample.db_time,
+            'request_view_duration_seconds': sample.view_time,
+            'request_render_duration_seconds': sample.render_time,
+            'response_size_bytes': size,
+        }
+        with self._lock:
+            histograms = self.histograms.get((view, method))
+            if histograms is None:
+                histograms = self.histograms[view, method] = {
+                    name: Histogram() for name in METRICS
+                }
+            for name, value in values.items():
+                if value is not None:
+                    histograms[name].record(int(value * METRICS[name][1]))
+
+    def export(self):
+        """Гистограммы как summary в текстовом формате Prometheus."""
+        pid = os.getpid()
+        lines = []
+        with self._lock:
+            for name, (help_text, scale) in METRICS.items():
+                lines.append(f'# HELP foodgram_{name} {help_text}')
+                lines.append(f'# TYPE foodgram_{name} summary')
+                for (view, method), histograms in sorted(
+                    self.histograms.items()
+                ):
+                    histogram = histograms[name]
+                    if not histogram.count:
+                        continue
+                    labels = (
+                        f'view="{escape(view)}",method="{method}",pid="{pid}"'
+                    )
+                    for quantile in QUANTILES:
+                        lines.append(
+                            f'foodgram_{name}{{{labels},'
+                            f'quantile="{quantile}"}} '
+                            f'{histogram.quantile(quantile) / scale:g}'
+                        )
+                    lines.append(
+                        f'foodgram_{name}_sum{{{labels}}} '
+                        f'{histogram.total / scale:g}'
+                    )
+                    lines.append(
+                        f'foodgram_{name}_count{{{labels}}} {histogram.count}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return (
+        value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    )
+
+
+registry = Registry()
@@ -0,0 +1,80 @@
+"""
+Промежуточный слой метрик запросов.
+"""
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(request):
+    """Имя маршрута: `recipes-list`, `users-subscriptions`, `admin:index`."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name.removeprefix('api:')
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    # Файл отдается потоком: размер известен только из заголовка.
+    length = response.get('Content-Length')
+    return int(length) if length else None
+
+
+class MetricsMiddleware:
+    """
+    Пишет в api.metrics.registry время ответа, число и время запросов
+    к БД, время представления и рендеринга и размер ответа по имени
+    маршрута. Представление - от process_view до
+    process_template_response (ответ DRF до рендеринга), дальше -
+    рендеринг. Запросы дольше METRICS_SLOW_REQUEST_MS попадают в лог
+    вместе с самыми долгими SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = request._metrics_sample = metrics.RequestSample()
+        start = perf_counter()
+        with connection.execute_wrapper(sample):
+            response = self.get_response(request)
+        sample.finish()
+        duration = perf_counter() - start
+        view = view_name(request)
+        metrics.registry.record(
+            view, request.method, duration, sample, response_size(response)
+        )
+        if duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS:
+            self.log_slow(request, response, view, duration, sample)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_sample.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        request._metrics_sample.view_finished = perf_counter()
+        return response
+
+    def log_slow(self, request, response, view, duration, sample):
+        statements = ''.join(
+            f'\n  {count} x {elapsed * 1000:.1f} мс: {sql}'
+            for sql, count, elapsed in sample.worst(
+                settings.METRICS_SLOW_SQL_LIMIT
+            )
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s, %s): %.0f мс, SQL: %s за %.0f мс, '
+            'представление %.0f мс, рендеринг %.0f мс.%s',
+            request.method, request.get_full_path(), view,
+            response.status_code, duration * 1000, sample.queries,
+            sample.db_time * 1000, (sample.view_time or 0) * 1000,
+            (sample.render_time or 0) * 1000, statements
+        )
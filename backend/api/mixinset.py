@@ -1,10 +1,21 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import status
 from rest_framework.response import Response
 
+from .cache import get_version
+
 
 class DeleteObjectMixin:
     """Удаление объекта."""
 
+    @transaction.atomic
     def delete_obj(self, obj):
         if obj:
             obj.delete()
@@ -15,3 +26,67 @@ class DeleteObjectMixin:
             {'errors': 'Объект не существует.'},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class CachedResponseMixin:
+    """
+    Кэширование ответов list/retrieve для справочников.
+
+    Готовые байты ответа хранятся в кэше Django под ключом с версией
+    таблицы модели; версия меняется после коммита изменений модели,
+    поэтому старые записи просто перестают читаться. Ответ
+    отдается со строгим ETag, Last-Modified и Cache-Control, повторный
+    запрос браузера или nginx получает 304.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        name = self.queryset.model._meta.db_table
+        version, modified = get_version(name)
+        key = 'response:{}:{}:{}'.format(
+            name, version,
+            hashlib.sha1(request.get_full_path().encode()).hexdigest()
+        )
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = renderer.render(
+                response.data, request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            entry = (content, quote_etag(hashlib.sha256(content).hexdigest()))
+            cache.set(key, entry, settings.REFERENCE_CACHE_TIMEOUT)
+        content, etag = entry
+        headers = {
+            'ETag': etag,
+            'Last-Modified': http_date(modified),
+            'Cache-Control': (
+                f'public, max-age={settings.REFERENCE_CACHE_MAX_AGE}'
+            ),
+            'Vary': 'Accept',
+        }
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(modified)
+        )
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+            return not_modified
+        return HttpResponse(
+            content,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+            if renderer.charset else renderer.media_type,
+            headers=headers
+        )
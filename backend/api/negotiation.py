@@ -0,0 +1,19 @@
+"""
+Выбор рендерера без учета запроса клиента.
+"""
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Всегда первый рендерер.
+
+    Для выгрузки файлов параметр `format` задает формат файла,
+    а не рендерер DRF, а ошибки отдаются в JSON.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
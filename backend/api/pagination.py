@@ -1,10 +1,149 @@
 """
 Настройка постраничной навигации.
 """
+import base64
+import binascii
+import json
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(values):
+    # Дата целиком, с микросекундами: DjangoJSONEncoder их обрезает.
+    return base64.urlsafe_b64encode(json.dumps(
+        values, default=lambda value: value.isoformat()
+    ).encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise NotFound('Неверный курсор.')
+    if not isinstance(values, list) or len(values) != size:
+        raise NotFound('Неверный курсор.')
+    return values
+
+
+def keyset_ordering(queryset):
+    """Сортировка запроса, дополненная id для однозначности."""
+    ordering = list(
+        queryset.query.order_by or queryset.model._meta.ordering
+    ) or ['id']
+    if any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+        return ordering
+    return ordering + [('-' if ordering[-1].startswith('-') else '') + 'id']
+
+
+def after(ordering, values):
+    """
+    Условие "строка после позиции `values`" для сортировки `ordering`:
+    a >= x AND ((a > x) OR (a = x AND b > y) OR ...) с учетом
+    направления полей. Первое условие - диапазон по индексу.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    field = ordering[0]
+    lookup = 'lte' if field.startswith('-') else 'gte'
+    return Q(**{f'{field.lstrip("-")}__{lookup}': values[0]}) & condition
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничная навигация по номеру страницы (?page=&limit=) или,
+    с параметром ?cursor=, по курсору.
+
+    Курсор - непрозрачный токен со значениями полей сортировки
+    последней строки страницы (для рецептов - pub_date и id), следующая
+    страница выбирается условием по индексу без OFFSET. Общее число
+    строк считается только по запросу ?count=1. Первая страница -
+    ?cursor= без значения.
+    """
     page_size_query_param = 'limit'
     page_query_param = 'page'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = keyset_ordering(queryset)
+        queryset = queryset.order_by(*ordering)
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            try:
+                queryset = queryset.filter(
+                    after(ordering, decode_cursor(cursor, len(ordering)))
+                )
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound('Неверный курсор.')
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = encode_cursor([
+                attrgetter(field.lstrip('-').replace('__', '.'))(page[-1])
+                for field in ordering
+            ])
+        return page
+
+    def paginate_positions(self, fetch, request):
+        """
+        Навигация по курсору для списка, который собирается не одним
+        запросом (лента подписок): fetch(position, size) возвращает
+        до size позиций (pub_date, id) после position. Вернем id.
+        """
+        self.keyset = True
+        self.request = request
+        self.count = None
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            positions = fetch(
+                decode_cursor(cursor, 2) if cursor else None, page_size + 1
+            )
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound('Неверный курсор.')
+        self.next_cursor = None
+        if len(positions) > page_size:
+            positions = positions[:page_size]
+            self.next_cursor = encode_cursor(list(positions[-1]))
+        return [object_id for _, object_id in positions]
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            remove_query_param(
+                self.request.build_absolute_uri(), self.page_query_param
+            ),
+            self.cursor_query_param, self.next_cursor
+        )
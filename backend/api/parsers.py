@@ -0,0 +1,64 @@
+"""
+Дополнительные парсеры тела запроса.
+"""
+import codecs
+import json
+
+from django.conf import settings
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, DataAndFiles, MultiPartParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    JSON lines: отдает итератор строк тела запроса.
+
+    Строки читаются из потока по мере обработки, тело целиком
+    в память не загружается.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get(
+            'encoding', settings.DEFAULT_CHARSET
+        )
+        if stream is None:
+            return iter(())
+        return codecs.getreader(encoding)(stream)
+
+
+class UploadedFiles(MultiValueDict):
+    """
+    Файлы запроса для JSONMultiPartParser. DRF склеивает их с data
+    через dict.update, а он копирует значения MultiValueDict (списки)
+    напрямую, если __iter__ не переопределен; с ним берет self[key] -
+    последний файл поля.
+    """
+
+    def __iter__(self):
+        return super().__iter__()
+
+
+class JSONMultiPartParser(MultiPartParser):
+    """
+    multipart/form-data: файлы отдельными частями, остальные поля -
+    JSON-объектом в части `data` (как тело JSON-запроса).
+
+    Файлы пишутся обработчиками загрузки Django (FILE_UPLOAD_HANDLERS):
+    больше FILE_UPLOAD_MAX_MEMORY_SIZE - во временный файл на диске.
+    Без части `data` поля разбираются как обычная форма.
+    """
+    data_field = 'data'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        if self.data_field not in parsed.data:
+            return parsed
+        try:
+            data = json.loads(parsed.data[self.data_field])
+        except ValueError as error:
+            raise ParseError(f'Некорректный JSON в части data: {error}')
+        if not isinstance(data, dict):
+            raise ParseError('В части data ожидается объект.')
+        return DataAndFiles(data, UploadedFiles(parsed.files))
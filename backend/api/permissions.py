@@ -1,6 +1,9 @@
 """
 Предоставляет набор подключаемых разрешений.
 """
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -11,3 +14,19 @@ class AuthorOrReadOnly(permissions.BasePermission):
             request.method in permissions.SAFE_METHODS
             or obj.author == request.user
         )
+
+
+class MetricsPermission(permissions.BasePermission):
+    """
+    Метрики: администратору или по токену METRICS_TOKEN в заголовке
+    `Authorization: Bearer <токен>` (bearer_token в Prometheus).
+    """
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        keyword, _, token = request.headers.get(
+            'Authorization', ''
+        ).partition(' ')
+        return bool(settings.METRICS_TOKEN) and keyword == 'Bearer' and (
+            hmac.compare_digest(token, settings.METRICS_TOKEN)
+        )
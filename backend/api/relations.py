@@ -0,0 +1,169 @@
+"""
+Кэш связей пользователя: избранное, корзина и подписки.
+"""
+from array import array
+from bisect import bisect_left
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from recipes.models import Cart, Favorite, Subscription
+
+RELATIONS_KEY = 'relations:{}:{}'
+# Поколение вида связи: новое при каждом изменении.
+GENERATION_KEY = 'relations:generation:{}:{}'
+# Значение в кэше вместо id, если их больше RELATIONS_CACHE_MAX_IDS.
+OVERFLOW = 'overflow'
+# Связь: модель и поле с id объекта.
+KINDS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'cart': (Cart, 'recipe_id'),
+    'subscriptions': (Subscription, 'author_id'),
+}
+# Сколько id фильтр рецептов подставляет в IN, больше - подзапросом.
+FILTER_MAX_IDS = 1000
+
+
+class IdSet:
+    """
+    Отсортированный массив 64-битных id.
+
+    8 байт на id, проверка вхождения бинарным поиском. В кэше
+    хранится как bytes массива.
+    """
+
+    def __init__(self, ids=()):
+        self.ids = array('q', sorted(ids))
+
+    @classmethod
+    def frombytes(cls, data):
+        id_set = cls()
+        id_set.ids.frombytes(data)
+        return id_set
+
+    def tobytes(self):
+        return self.ids.tobytes()
+
+    @property
+    def nbytes(self):
+        return len(self.ids) * self.ids.itemsize
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, value):
+        index = bisect_left(self.ids, value)
+        return index < len(self.ids) and self.ids[index] == value
+
+    def add(self, value):
+        index = bisect_left(self.ids, value)
+        if index == len(self.ids) or self.ids[index] != value:
+            self.ids.insert(index, value)
+
+    def discard(self, value):
+        index = bisect_left(self.ids, value)
+        if index < len(self.ids) and self.ids[index] == value:
+            del self.ids[index]
+
+
+class UserRelations:
+    """
+    Связи одного пользователя, загружаются по требованию.
+
+    Каждый вид связи читается из БД одним запросом при первом
+    обращении и хранится в кэше Django вместе с поколением, при
+    котором прочитан; после изменения связи поколение меняется, и
+    старое значение больше не читается. Не больше
+    RELATIONS_CACHE_MAX_IDS id одного вида: если их больше, вид
+    не кэшируется и `get` возвращает None, вызывающий код делает
+    обычный запрос.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._loaded = {}
+
+    def get(self, kind):
+        if kind not in self._loaded:
+            self._loaded[kind] = self._load(kind)
+        return self._loaded[kind]
+
+    def contains(self, kind, value):
+        """Есть ли связь; None, если вид не кэшируется."""
+        ids = self.get(kind)
+        return None if ids is None else value in ids
+
+    @property
+    def nbytes(self):
+        """Память под загруженные виды связей."""
+        return sum(
+            ids.nbytes for ids in self._loaded.values() if ids is not None
+        )
+
+    def _load(self, kind):
+        key = RELATIONS_KEY.format(kind, self.user_id)
+        generation_key = GENERATION_KEY.format(kind, self.user_id)
+        cached = cache.get_many((key, generation_key))
+        generation = cached.get(generation_key)
+        if generation is None:
+            # Поколение читаем до запроса к БД: изменение после
+            # запроса сменит его, и прочитанное не будет использовано.
+            cache.add(
+                generation_key, uuid4().hex, settings.RELATIONS_CACHE_TIMEOUT
+            )
+            generation = cache.get(generation_key)
+        elif cached.get(key, (None,))[0] == generation:
+            data = cached[key][1]
+            return None if data == OVERFLOW else IdSet.frombytes(data)
+        model, field = KINDS[kind]
+        ids = list(
+            model.objects.filter(user_id=self.user_id).order_by()
+            .values_list(field, flat=True)[
+                :settings.RELATIONS_CACHE_MAX_IDS + 1
+            ]
+        )
+        id_set = None
+        data = OVERFLOW
+        if len(ids) <= settings.RELATIONS_CACHE_MAX_IDS:
+            id_set = IdSet(ids)
+            data = id_set.tobytes()
+        cache.set(key, (generation, data), settings.RELATIONS_CACHE_TIMEOUT)
+        return id_set
+
+
+def get_relations(request):
+    """Связи текущего пользователя, одни на запрос; None для анонима."""
+    if request is None or request.user.is_anonymous:
+        return None
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = request._user_relations = UserRelations(request.user.id)
+    return relations
+
+
+def has_relation(request, kind, value, related):
+    """
+    Связь текущего пользователя с объектом: по кэшу, а если вид
+    не кэшируется - запросом к `related` (менеджер связи объекта).
+    """
+    relations = get_relations(request)
+    if relations is None:
+        return False
+    found = relations.contains(kind, value)
+    if found is None:
+        return related.filter(user=request.user).exists()
+    return found
+
+
+def invalidate_relations(kind, user_id):
+    """
+    Новое поколение вида связи пользователя. Вызывается после
+    коммита: закэшированный набор, прочитанный раньше, устареет.
+    """
+    cache.set(
+        GENERATION_KEY.format(kind, user_id), uuid4().hex,
+        settings.RELATIONS_CACHE_TIMEOUT
+    )
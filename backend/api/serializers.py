@@ -1,15 +1,22 @@
 """
 Настройка сериализации/десереализацией данных.
 """
-import base64
-
-from django.core.files.base import ContentFile
+from django.conf import settings as django_settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.urls import reverse
 from djoser.conf import settings
-from recipes.models import (Cart, Favorite, Ingredient, Recipe,
-                            RecipeIngredient, Subscription, Tag, User)
+from recipes.models import (Cart, ExportJob, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingList, Subscription, Tag,
+                            User)
+from recipes.signals import recipes_changed
 from rest_framework import serializers, status
 from rest_framework.settings import api_settings
 
+from . import images
+from .relations import has_relation
+
 
 class CustomUserSerializer(serializers.ModelSerializer):
     """Вывод данных пользователя."""
@@ -24,22 +31,39 @@ class CustomUserSerializer(serializers.ModelSerializer):
         read_only_fields = (settings.LOGIN_FIELD,)
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return False if user.is_anonymous else obj.subscribing.filter(
-            user=user
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return has_relation(
+            self.context.get('request'), 'subscriptions', obj.id,
+            obj.subscribing
+        )
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на превью и WebP картинки рецепта."""
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in value.items():
+            url = default_storage.url(name)
+            urls[variant] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return urls
 
 
 class RecipeInfoSerializer(serializers.ModelSerializer):
     """Краткая информация о рецепте."""
+    image_variants = ImageVariantsField()
+
     class Meta:
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         model = Recipe
 
 
 class SubscribeSerializer(CustomUserSerializer):
     """Список подписки пользователя."""
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
     recipes = serializers.SerializerMethodField()
 
     class Meta(CustomUserSerializer.Meta):
@@ -52,28 +76,21 @@ class SubscribeSerializer(CustomUserSerializer):
         )
 
     def get_recipes(self, obj):
-        recipes_limit = self.context.get('request').query_params.get(
+        recipes_limit = self.context.get(
             'recipes_limit', api_settings.PAGE_SIZE
         )
-        try:
-            recipes_limit = int(self.context.get('request').query_params.get(
-                'recipes_limit', api_settings.PAGE_SIZE
-            ))
-            recipes = obj.recipes.all()[:recipes_limit]
-        except ValueError:
-            recipes = obj.recipes.all()[:api_settings.PAGE_SIZE]
+        recipes = getattr(obj, 'recent_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
         return RecipeInfoSerializer(
-            recipes, many=True, context=self.context
+            recipes[:recipes_limit], many=True, context=self.context
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class TagSerializer(serializers.ModelSerializer):
     """Модель Tag."""
     class Meta:
-        fields = '__all__'
+        fields = ('id', 'name', 'color', 'slug')
         model = Tag
 
 
@@ -92,13 +109,6 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('amount', 'id')
         model = RecipeIngredient
 
-    def validate_id(self, value):
-        if not Ingredient.objects.filter(id=value).exists():
-            raise serializers.ValidationError(
-                f'{value} - ингредиента не существует.'
-            )
-        return value
-
 
 class AmountIngredientSerializer(serializers.ModelSerializer):
     """Поле ингредиент/кол-во при Get запросе к рецепту."""
@@ -117,13 +127,35 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для картики."""
+    """
+    Картинка data URI или файлом. Проверяем размер и формат по
+    заголовку и сразу сохраняем под именем из SHA-256 содержимого;
+    возвращаем имя файла. Превью строит image_worker.
+    """
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        try:
+            if isinstance(data, str) and data.startswith('data:image'):
+                with images.decode_base64(data) as file:
+                    return images.save_original(file)
+            file = serializers.FileField.to_internal_value(self, data)
+            if file.size > django_settings.IMAGE_MAX_SIZE:
+                raise ValueError('Слишком большой файл.')
+            return images.save_original(file)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+
+
+def recipe_prefetch():
+    """Связанные данные рецептов для GetRecipeSerializer."""
+    return (
+        'tags',
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related(
+                'ingredient'
+            ).order_by('id')
+        )
+    )
 
 
 class GetRecipeSerializer(serializers.ModelSerializer):
@@ -134,27 +166,28 @@ class GetRecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         depth = 1
         fields = tuple(Recipe.REQUIRED_FIELDS) + (
             'id',
+            'image_variants',
             'is_favorited',
             'is_in_shopping_cart'
         )
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return obj.recipes_favorite.filter(user=user).exists()
+        return has_relation(
+            self.context.get('request'), 'favorites', obj.id,
+            obj.recipes_favorite
+        )
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return obj.recipes_cart.filter(user=user).exists()
+        return has_relation(
+            self.context.get('request'), 'cart', obj.id, obj.recipes_cart
+        )
 
 
 class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
@@ -183,6 +216,14 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
         return value
 
     def validate_ingredients(self, value):
+        return self.check_ingredients(value, Ingredient.objects.in_bulk)
+
+    @staticmethod
+    def check_ingredients(value, existing):
+        """
+        Правила списка ингредиентов, общие с импортом рецептов:
+        `existing(ids)` - те из id, что есть в справочнике.
+        """
         if not value:
             raise serializers.ValidationError('Необходимо ввести ингредиент.')
         ingredients = [index['id'] for index in value]
@@ -190,17 +231,50 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингридиенты не могут повторяться!'
             )
+        existing = existing(ingredients)
+        missing = [
+            str(ingredient) for ingredient in ingredients
+            if ingredient not in existing
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f'{", ".join(missing)} - ингредиента не существует.'
+            )
         return value
 
-    def save_tags_ingredients(self, ingredients, recipe):
-        RecipeIngredient.objects.bulk_create(
-            [RecipeIngredient(
-                ingredient=Ingredient.objects.get(id=ingredient['id']),
-                recipe=recipe,
-                amount=ingredient.get('amount')
-            ) for ingredient in ingredients]
-        )
-
+    def save_tags_ingredients(self, ingredients, recipe, existing=()):
+        """
+        Сохраняем ингредиенты рецепта по разнице с текущими строками.
+
+        Вставляем новые, меняем кол-во у изменившихся и удаляем лишние -
+        не больше трех запросов при любом числе ингредиентов.
+        """
+        existing = {row.ingredient_id: row for row in existing}
+        amounts = {
+            ingredient['id']: ingredient.get('amount', 1)
+            for ingredient in ingredients
+        }
+        created, updated = [], []
+        for ingredient, amount in amounts.items():
+            row = existing.get(ingredient)
+            if row is None:
+                created.append(RecipeIngredient(
+                    ingredient_id=ingredient, recipe=recipe, amount=amount
+                ))
+            elif row.amount != amount:
+                row.amount = amount
+                updated.append(row)
+        deleted = [
+            row.id for ingredient, row in existing.items()
+            if ingredient not in amounts
+        ]
+        RecipeIngredient.objects.bulk_create(created)
+        RecipeIngredient.objects.bulk_update(updated, ('amount',))
+        if deleted:
+            RecipeIngredient.objects.filter(id__in=deleted).delete()
+        return amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -210,24 +284,36 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
             ingredients=ingredients,
             recipe=recipe
         )
+        recipes_changed.send(sender=Recipe, recipe_ids=(recipe.id,))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        existing = list(
+            RecipeIngredient.objects.filter(recipe=instance).order_by()
+        )
+        old_amounts = {row.ingredient_id: row.amount for row in existing}
+        if validated_data.get('image', instance.image) != instance.image:
+            validated_data['image_variants'] = {}
         instance = super().update(instance, validated_data)
         instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.save_tags_ingredients(
+        new_amounts = self.save_tags_ingredients(
             ingredients=ingredients,
-            recipe=instance
+            recipe=instance,
+            existing=existing
         )
-        instance.save()
+        ShoppingList.objects.update_recipe(
+            instance, old_amounts, new_amounts
+        )
+        recipes_changed.send(sender=Recipe, recipe_ids=(instance.id,))
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects([instance], *recipe_prefetch())
         return GetRecipeSerializer(instance, context=context).data
 
 
@@ -287,3 +373,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                 code=status.HTTP_400_BAD_REQUEST
             )
         return attrs
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Статус фоновой выгрузки списка покупок."""
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'file_format', 'status', 'error', 'created', 'url')
+
+    def get_url(self, obj):
+        return self.context['request'].build_absolute_uri(reverse(
+            'api:recipes-download-shopping-cart-job',
+            kwargs={'job_id': obj.id}
+        ))
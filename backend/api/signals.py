@@ -0,0 +1,111 @@
+"""
+Обновление индексов и кэшей API при изменении данных.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from recipes.models import (Cart, Favorite, Ingredient, Recipe, Subscription,
+                            Tag)
+from recipes.signals import recipes_changed, reference_data_changed
+
+from .cache import bump_version
+from .feed import fan_out, follow, unfollow
+from .images import request_variants
+from .indexes import ingredient_index
+from .matcher import record_change
+from .relations import KINDS, invalidate_relations
+
+# Модель связи: вид связи.
+RELATIONS = {model: kind for kind, (model, _) in KINDS.items()}
+
+
+def reference_changed(models):
+    """
+    Новые версии справочников после коммита: до него читатель
+    сохранил бы в кэш под новой версией старые данные.
+    """
+    def bump():
+        for model in models:
+            bump_version(model._meta.db_table)
+        if Ingredient in models:
+            ingredient_index.reset()
+
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reference_saved(sender, **kwargs):
+    reference_changed((sender,))
+
+
+@receiver(reference_data_changed)
+def reference_data_reloaded(sender, models, **kwargs):
+    reference_changed(tuple(models))
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=Cart)
+@receiver(pre_save, sender=Subscription)
+def relation_saving(sender, instance, raw=False, **kwargs):
+    """Связь могут передать другому пользователю (админка)."""
+    if instance.pk is not None and not raw:
+        instance._previous_user_id = sender.objects.filter(
+            pk=instance.pk
+        ).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Subscription)
+def relation_changed(sender, instance, **kwargs):
+    kind = RELATIONS[sender]
+    users = {instance.user_id, getattr(instance, '_previous_user_id', None)}
+    users.discard(None)
+
+    def invalidate():
+        for user_id in users:
+            invalidate_relations(kind, user_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(recipes_changed)
+def recipes_matcher_changed(sender, recipe_ids, **kwargs):
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: record_change(recipe_ids))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    recipe_id = instance.id
+    transaction.on_commit(lambda: record_change((recipe_id,)))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance.author_id, (instance,))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image and not instance.image_variants:
+        image = instance.image.name
+        transaction.on_commit(lambda: request_variants(image))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    unfollow(instance.user_id, instance.author_id)
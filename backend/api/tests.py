@@ -0,0 +1,716 @@
+"""
+Тесты API: число запросов к БД на горячих путях и согласованность
+денормализованных данных.
+"""
+import base64
+import json
+import os
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingList, Subscription, Tag,
+                            TimelineEntry, User, tags_mask)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .images import DECODE_CHUNK_SIZE, decode_base64
+from .importer import RecipeImporter
+
+# Запись рецепта в поисковый индекс: UPDATE в PostgreSQL, в SQLite -
+# DELETE, SELECT и INSERT в таблицу FTS5.
+SEARCH_QUERIES = {'postgresql': 1, 'sqlite': 3}
+# Свой каталог кэша: cache.clear() в тестах не трогает общий.
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(),
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeListQueriesTest(TestCase):
+    """Список рецептов - фиксированное число запросов на страницу."""
+    PAGE_SIZES = (1, 6, 100)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pw',
+            first_name='Имя', last_name='Фамилия'
+        )
+        authors = User.objects.bulk_create(
+            User(
+                username=f'author{index}', email=f'author{index}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for index in range(5)
+        )
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', slug=f'tag{index}', color='#FFFFFF'
+            )
+            for index in range(3)
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(20)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[index % len(authors)], name=f'Рецепт {index}',
+                text='Текст', cooking_time=10,
+                tags_mask=tags_mask(tag.bit for tag in tags)
+            )
+            for index in range(max(cls.PAGE_SIZES))
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes for tag in tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, amount=offset + 1,
+                ingredient=ingredients[(index + offset) % len(ingredients)]
+            )
+            for index, recipe in enumerate(recipes) for offset in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assert_list_queries(self, queries, page_size):
+        with self.assertNumQueries(queries):
+            response = self.client.get(f'/api/recipes/?limit={page_size}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+
+    def test_anonymous(self):
+        # COUNT, страница рецептов, теги, ингредиенты.
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                self.assert_list_queries(4, page_size)
+
+    def test_authenticated(self):
+        # Плюс избранное, корзина и подписки - один раз, дальше из кэша.
+        self.client.force_authenticate(self.user)
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size):
+                cache.clear()
+                self.assert_list_queries(7, page_size)
+                self.assert_list_queries(4, page_size)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SubscriptionsQueriesTest(TestCase):
+    """Подписки - фиксированное число запросов на страницу авторов."""
+    PAGE_SIZES = (1, 6)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pw',
+            first_name='Имя', last_name='Фамилия'
+        )
+        authors = User.objects.bulk_create(
+            User(
+                username=f'author{index}', email=f'author{index}@example.com',
+                first_name='Имя', last_name='Фамилия', recipes_count=5
+            )
+            for index in range(max(cls.PAGE_SIZES))
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.user, author=author) for author in authors
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10
+            )
+            for author in authors for index in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_subscriptions(self):
+        # COUNT, страница авторов, их последние рецепты.
+        for page_size in self.PAGE_SIZES:
+            with self.subTest(page_size=page_size), self.assertNumQueries(3):
+                response = self.client.get(
+                    f'/api/users/subscriptions/?limit={page_size}'
+                    '&recipes_limit=3'
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+            for author in response.data['results']:
+                self.assertEqual(len(author['recipes']), 3)
+                self.assertEqual(author['recipes_count'], 5)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CACHES=TEST_CACHES)
+class RecipeWriteQueriesTest(TestCase):
+    """
+    Создание и изменение рецепта - число запросов не зависит от
+    числа ингредиентов.
+    """
+    IMAGE = (
+        'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAA'
+        'BAAEAAAIBRAA7'
+    )
+    SIZES = (10, 40)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', slug=f'tag{index}', color='#FFFFFF'
+            ).id
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            ingredient.id for ingredient in Ingredient.objects.bulk_create(
+                Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+                for index in range(2 * max(cls.SIZES))
+            )
+        ]
+
+    def setUp(self):
+        cache.clear()
+        token = Token.objects.create(user=self.author)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def assert_queries(self, count):
+        """`count` - для PostgreSQL."""
+        return self.assertNumQueries(
+            count - SEARCH_QUERIES['postgresql']
+            + SEARCH_QUERIES[connection.vendor]
+        )
+
+    def payload(self, ingredients, amount=1):
+        return {
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+            'image': self.IMAGE, 'tags': self.tags,
+            'ingredients': [
+                {'id': ingredient, 'amount': amount}
+                for ingredient in ingredients
+            ],
+        }
+
+    def create(self, size):
+        response = self.client.post(
+            '/api/recipes/', self.payload(self.ingredients[:size]),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_create(self):
+        # С пустым кэшем связей: флаги ответа - еще три запроса.
+        for size in self.SIZES:
+            cache.clear()
+            with self.subTest(ingredients=size), self.assert_queries(25):
+                self.create(size)
+
+    def test_update(self):
+        # Половина ингредиентов остается с новым кол-вом, половина
+        # заменяется: вставка, изменение и удаление. Кэш связей
+        # заполнен ответом на создание.
+        for size in self.SIZES:
+            recipe = self.create(size)
+            ingredients = self.ingredients[size // 2:size + size // 2]
+            with self.subTest(ingredients=size), self.assert_queries(19):
+                response = self.client.patch(
+                    f'/api/recipes/{recipe}/',
+                    self.payload(ingredients, amount=2), format='json'
+                )
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(
+                sorted(row['id'] for row in response.data['ingredients']),
+                ingredients
+            )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CACHES=TEST_CACHES)
+class ShoppingListTest(TestCase):
+    """Список покупок совпадает с суммой ингредиентов рецептов корзины."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.user, cls.other = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='pw',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for name in ('author', 'user', 'other')
+        )
+        cls.tag = Tag.objects.create(
+            name='Тег', slug='tag', color='#FFFFFF'
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(6)
+        )
+        cls.recipes = []
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10
+            )
+            recipe.tags.set((cls.tag,))
+            # Соседние рецепты делят два ингредиента.
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, amount=index + offset + 1,
+                    ingredient=cls.ingredients[2 * index + offset]
+                )
+                for offset in range(4)
+                if 2 * index + offset < len(cls.ingredients)
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_consistent(self):
+        expected = Counter()
+        for user, recipe in Cart.objects.values_list('user', 'recipe'):
+            for ingredient, amount in RecipeIngredient.objects.filter(
+                recipe=recipe
+            ).values_list('ingredient', 'amount'):
+                expected[user, ingredient] += amount
+        self.assertEqual(
+            dict(
+                ((user, ingredient), amount)
+                for user, ingredient, amount in
+                ShoppingList.objects.values_list(
+                    'user', 'ingredient', 'amount'
+                )
+            ),
+            dict(expected)
+        )
+
+    def add_to_cart(self, client, recipe):
+        response = client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assert_consistent()
+
+    def fill_carts(self):
+        other = APIClient()
+        other.force_authenticate(self.other)
+        for recipe in self.recipes:
+            self.add_to_cart(self.client, recipe)
+        self.add_to_cart(other, self.recipes[1])
+
+    def test_cart_add_delete(self):
+        self.fill_carts()
+        for recipe in self.recipes[:2]:
+            response = self.client.delete(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+            self.assertEqual(response.status_code, 204)
+            self.assert_consistent()
+
+    def test_update_recipe(self):
+        self.fill_carts()
+        self.client.force_authenticate(self.author)
+        recipe = self.recipes[1]
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', {
+                'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+                'tags': [self.tag.id],
+                'image': RecipeWriteQueriesTest.IMAGE,
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 7}
+                    for ingredient in self.ingredients[3:]
+                ],
+            }, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_consistent()
+
+    def test_cascade_delete(self):
+        self.fill_carts()
+        self.ingredients[2].delete()
+        self.assert_consistent()
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_consistent()
+        self.author.delete()
+        self.assert_consistent()
+
+    def test_admin_reassign(self):
+        self.fill_carts()
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pw'
+        )
+        self.client.force_login(admin)
+        cart = Cart.objects.get(user=self.user, recipe=self.recipes[2])
+        response = self.client.post(
+            f'/admin/recipes/cart/{cart.id}/change/',
+            {'user': self.other.id, 'recipe': self.recipes[2].id}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Cart.objects.get(id=cart.id).user, self.other)
+        self.assert_consistent()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RelationsCacheTest(TestCase):
+    """Флаги связей в ответах меняются только после коммита."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.user = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='pw',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for name in ('author', 'user')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст', cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def flags(self):
+        data = self.client.get(f'/api/recipes/{self.recipe.id}/').data
+        return (
+            data['is_favorited'], data['is_in_shopping_cart'],
+            data['author']['is_subscribed']
+        )
+
+    def change(self, method, flags):
+        urls = (
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            f'/api/users/{self.author.id}/subscribe/',
+        )
+        for url in urls:
+            with self.subTest(url=url, method=method):
+                before = self.flags()
+                with self.captureOnCommitCallbacks() as callbacks:
+                    response = getattr(self.client, method)(url)
+                    self.assertIn(response.status_code, (201, 204))
+                    # До коммита кэш прежний.
+                    self.assertEqual(self.flags(), before)
+                for callback in callbacks:
+                    callback()
+                self.assertNotEqual(self.flags(), before)
+        self.assertEqual(self.flags(), flags)
+
+    def test_add_and_delete(self):
+        self.assertEqual(self.flags(), (False, False, False))
+        self.change('post', (True, True, True))
+        self.change('delete', (False, False, False))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TagsMaskTest(TestCase):
+    """tags_mask рецепта совпадает с битами его тегов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pw',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', slug=f'tag{index}', color='#FFFFFF'
+            )
+            for index in range(3)
+        ]
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10
+            )
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_masks(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.tags_mask,
+                tags_mask(recipe.tags.values_list('bit', flat=True)),
+                recipe.name
+            )
+
+    def test_set_and_clear(self):
+        first, second = self.recipes
+        first.tags.set(self.tags[:2])
+        second.tags.set(self.tags[1:])
+        self.assert_masks()
+        first.tags.set(self.tags[2:])
+        self.assert_masks()
+        first.tags.clear()
+        self.assert_masks()
+        self.tags[0].recipe_set.add(first, second)
+        self.assert_masks()
+        self.tags[1].recipe_set.remove(second)
+        self.assert_masks()
+        self.tags[2].recipe_set.clear()
+        self.assert_masks()
+
+    def test_tag_delete(self):
+        for recipe in self.recipes:
+            recipe.tags.set(self.tags)
+        self.tags[1].delete()
+        self.assert_masks()
+        self.assertEqual(
+            Recipe.objects.with_tags((self.tags[0].bit,)).count(), 2
+        )
+
+    def test_import(self):
+        importer = RecipeImporter(self.author)
+        report = importer.run([
+            json.dumps({
+                'name': f'Импорт {index}', 'text': 'Текст',
+                'cooking_time': 10, 'tags': tags,
+                'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            })
+            for index, tags in enumerate(
+                (['tag0'], ['tag1', self.tags[2].id])
+            )
+        ])
+        self.assertEqual(report['created'], 2, report['errors'])
+        self.assert_masks()
+
+    def test_bit_not_exposed(self):
+        response = APIClient().get('/api/tags/')
+        self.assertEqual(
+            set(response.json()[0]), {'id', 'name', 'color', 'slug'}
+        )
+
+
+class QueryPlansTest(TestCase):
+    """Горячие запросы идут по индексам на тестовой БД."""
+
+    def test_check_query_plans(self):
+        stdout = StringIO()
+        call_command('check_query_plans', stdout=stdout)
+        self.assertIn(
+            'Все горячие запросы идут по индексам.', stdout.getvalue()
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CountersTest(TestCase):
+    """Счетчики рецептов и пользователей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.user = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com', password='pw',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for name in ('author', 'user')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст', cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_counters(self, favorites, cart, recipes, subscribers):
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        author = User.objects.get(id=self.author.id)
+        self.assertEqual(
+            (
+                recipe.favorites_count, recipe.cart_count,
+                author.recipes_count, author.subscribers_count
+            ),
+            (favorites, cart, recipes, subscribers)
+        )
+
+    def test_up_and_down(self):
+        self.assert_counters(0, 0, 1, 0)
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        Recipe.objects.create(
+            author=self.author, name='Второй', text='Текст', cooking_time=1
+        )
+        self.assert_counters(1, 1, 2, 1)
+        self.client.delete(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.client.delete(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        Recipe.objects.filter(name='Второй').get().delete()
+        self.assert_counters(0, 0, 1, 0)
+
+    def test_not_below_zero(self):
+        favorite = Favorite.objects.create(user=self.user, recipe=self.recipe)
+        subscription = Subscription.objects.create(
+            user=self.user, author=self.author
+        )
+        # Рассинхрон: счетчики уже обнулены.
+        Recipe.objects.update(favorites_count=0)
+        User.objects.update(subscribers_count=0, recipes_count=0)
+        favorite.delete()
+        subscription.delete()
+        self.recipe.delete()
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=1
+        )
+        self.recipe = recipe
+        self.assert_counters(0, 0, 1, 0)
+
+    def test_full_save_keeps_counters(self):
+        # Объекты в памяти прочитаны до изменения счетчиков.
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        author = User.objects.get(id=self.author.id)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Cart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Новое имя'
+        author.save()
+        self.assert_counters(1, 1, 1, 1)
+        self.assertEqual(
+            Recipe.objects.get(id=self.recipe.id).name, 'Новое название'
+        )
+
+
+@override_settings(CACHES=TEST_CACHES, FEED_MAX_LENGTH=3)
+class FeedTest(TestCase):
+    """Ленты подписок: раскладка, обрезка и отписка."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = User.objects.bulk_create(
+            User(
+                username=f'author{index}', email=f'author{index}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for index in range(2)
+        )
+        cls.readers = User.objects.bulk_create(
+            User(
+                username=f'reader{index}', email=f'reader{index}@example.com',
+                first_name='Имя', last_name='Фамилия'
+            )
+            for index in range(2)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def publish(self, author, count):
+        return [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10
+            ).id
+            for index in range(count)
+        ]
+
+    def timeline(self, reader):
+        return list(
+            TimelineEntry.objects.filter(user=reader)
+            .order_by('-pub_date', '-recipe_id')
+            .values_list('recipe_id', flat=True)
+        )
+
+    def test_fan_out(self):
+        author, other = self.authors
+        for reader in self.readers:
+            Subscription.objects.create(user=reader, author=author)
+        recipes = self.publish(author, 2)
+        self.publish(other, 1)
+        for reader in self.readers:
+            self.assertEqual(self.timeline(reader), recipes[::-1])
+        # Сверх FEED_MAX_LENGTH остаются только новые записи.
+        recipes += self.publish(author, 3)
+        for reader in self.readers:
+            self.assertEqual(self.timeline(reader), recipes[:-4:-1])
+
+    def test_follow_and_unfollow(self):
+        author, other = self.authors
+        reader = self.readers[0]
+        recipes = self.publish(author, 5)
+        others = self.publish(other, 1)
+        Subscription.objects.create(user=reader, author=author)
+        self.assertEqual(self.timeline(reader), recipes[:-4:-1])
+        Subscription.objects.create(user=reader, author=other)
+        self.assertEqual(
+            self.timeline(reader), others + recipes[:-3:-1]
+        )
+        Subscription.objects.get(user=reader, author=author).delete()
+        self.assertEqual(self.timeline(reader), others)
+
+    def test_read_does_not_write(self):
+        reader = self.readers[0]
+        Subscription.objects.create(user=reader, author=self.authors[0])
+        # Лента длиннее FEED_MAX_LENGTH: trim_feeds еще не запускалась.
+        with self.settings(FEED_MAX_LENGTH=10):
+            self.publish(self.authors[0], 5)
+        client = APIClient()
+        client.force_authenticate(reader)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertFalse([
+            query for query in queries
+            if not query['sql'].lstrip().upper().startswith('SELECT')
+        ])
+        call_command('trim_feeds', stdout=StringIO())
+        self.assertEqual(len(self.timeline(reader)), 3)
+
+
+class DecodeBase64Test(TestCase):
+    """Data URI с переносами строк декодируется, в том числе порциями."""
+
+    def decode(self, encoded):
+        file = decode_base64(f'data:image/png;base64,{encoded}')
+        with file:
+            return file.read()
+
+    def test_line_breaks(self):
+        # Больше одной порции, переносы по MIME через 76 символов.
+        data = os.urandom(DECODE_CHUNK_SIZE)
+        encoded = base64.encodebytes(data).decode()
+        self.assertEqual(self.decode(encoded), data)
+        self.assertEqual(
+            self.decode(encoded.replace('\n', '\r\n  ')), data
+        )
+
+    def test_invalid(self):
+        for encoded in ('abc', 'ab!d', 'YWJj\nZA'):
+            with self.subTest(encoded=encoded):
+                with self.assertRaises(ValueError):
+                    self.decode(encoded)
@@ -6,8 +6,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                    TagViewSet)
+from .views import (CustomUserViewSet, IngredientViewSet, MetricsView,
+                    RecipeViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -20,6 +20,7 @@ router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
+    path('_metrics', MetricsView.as_view(), name='metrics'),
     path('', include((router.urls))),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,38 +1,129 @@
 """
-Создание pdf-файла.
+Создание файлов со списком покупок: pdf, csv и txt.
 """
+import csv
+import hashlib
+import json
+from functools import lru_cache
+from io import BytesIO
+
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import (HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
+from django.utils.http import parse_etags, quote_etag
+from recipes.models import ShoppingList
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
 from reportlab.platypus.tables import TableStyle
 from reportlab.rl_config import TTFSearchPath
 
+from .cache import RenderCache
+
 TTFSearchPath.append(str(settings.BASE_DIR) + '/fonts')
 
+# Увеличиваем при изменении оформления, чтобы не отдавать старые файлы.
+PDF_LAYOUT_VERSION = 2
+# Строк в одной таблице pdf-файла: таблица умещается на странице.
+PDF_ROWS_PER_TABLE = 20
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'csv': 'text/csv; charset=utf-8',
+    'txt': 'text/plain; charset=utf-8',
+}
+SHOPPING_LIST_FORMATS = tuple(CONTENT_TYPES)
+SHOPPING_LIST_HEADER = ('Ингредиент', 'Кол-во', 'Ед. измерения')
+SHOPPING_LIST_TITLE = 'Список покупок.'
+SHOPPING_LIST_CHUNK_SIZE = 2000
 
-def pdf_file_table(data, header_table):
-    """Создаем таблицу в пдф-файле."""
-    response = HttpResponse(headers={
-        'Content-Type': 'application/pdf',
-        'Content-Disposition': 'attachment'
-    })
-    pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
-    elements = []
+pdf_cache = RenderCache(
+    directory=settings.SHOPPING_LIST_CACHE_DIR,
+    max_size=settings.SHOPPING_LIST_CACHE_SIZE,
+    max_disk_size=settings.SHOPPING_LIST_CACHE_DISK_SIZE,
+    suffix='.pdf'
+)
+
+
+def shopping_list(user):
+    """Строки списка покупок: ингредиент, кол-во, ед. измерения."""
+    return (
+        ShoppingList.objects
+        .filter(user=user)
+        .order_by('ingredient__name')
+        .values_list('ingredient__name', 'amount',
+                     'ingredient__measurement_unit')
+    )
+
+
+def render_shopping_list(user, file_format):
+    """Файл со списком покупок целиком (для фоновой выгрузки)."""
+    rows = shopping_list(user)
+    if file_format == 'pdf':
+        data = [SHOPPING_LIST_HEADER, *rows]
+        return pdf_cache.get_or_render(
+            content_hash(PDF_LAYOUT_VERSION, SHOPPING_LIST_TITLE, data),
+            lambda: render_pdf_table(data, SHOPPING_LIST_TITLE)
+        )
+    return b''.join(
+        line.encode() for line in file_lines(
+            rows.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE),
+            SHOPPING_LIST_HEADER, SHOPPING_LIST_TITLE, file_format
+        )
+    )
 
-    styles = getSampleStyleSheet()
-    styles_header_table = styles['Normal']
-    styles_header_table.fontName = 'Arial'
-    styles_header_table.fontSize = 22
-    styles_header_table.alignment = 1
 
-    doc = SimpleDocTemplate(response, pagesize=letter)
-    table = Table(data, colWidths=(310, 70, None), rowHeights=30)
-    table.setStyle(TableStyle([
+def content_hash(*parts):
+    """Хэш данных, из которых строится файл."""
+    return hashlib.sha256(json.dumps(
+        parts, ensure_ascii=False, default=str
+    ).encode()).hexdigest()
+
+
+def pdf_file_table(request, data, header_table):
+    """
+    Отдаем pdf-файл с таблицей.
+
+    Файл рендерится один раз для одинакового содержимого, по ETag
+    браузер может получить 304 без повторной загрузки.
+    """
+    key = content_hash(PDF_LAYOUT_VERSION, header_table, data)
+    etag = quote_etag(key)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        return HttpResponseNotModified(headers={'ETag': etag})
+    return HttpResponse(
+        pdf_cache.get_or_render(
+            key, lambda: render_pdf_table(data, header_table)
+        ),
+        headers={
+            'Content-Type': 'application/pdf',
+            'Content-Disposition': 'attachment',
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache'
+        }
+    )
+
+
+@lru_cache(maxsize=None)
+def pdf_styles():
+    """
+    Шрифт, стиль заголовка и стиль таблицы.
+
+    Создаются один раз на процесс при первом рендере и дальше только
+    читаются, поэтому их можно разделять между запросами.
+    """
+    pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
+    header_style = ParagraphStyle(
+        'ShoppingListHeader',
+        parent=getSampleStyleSheet()['Normal'],
+        fontName='Arial',
+        fontSize=22,
+        alignment=1
+    )
+    table_style = TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.brown),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -46,10 +137,76 @@ def pdf_file_table(data, header_table):
         ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
         ('VALIGN', (-1, 0), (-2, 0), 'MIDDLE'),
         ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
-    ]))
+    ])
+    return header_style, table_style
+
+
+def render_pdf_table(data, header_table):
+    """
+    Создаем таблицу в пдф-файле.
+
+    Таблица разбивается на части по странице, каждая со строкой
+    заголовка, чтобы ReportLab не раскладывал одну огромную таблицу.
+    """
+    header_style, table_style = pdf_styles()
+    header, rows = data[0], data[1:]
+    elements = [
+        Paragraph(header_table, header_style),
+        Spacer(height=30, width=1)
+    ]
+    for start in range(0, max(len(rows), 1), PDF_ROWS_PER_TABLE):
+        table = Table(
+            [header, *rows[start:start + PDF_ROWS_PER_TABLE]],
+            colWidths=(310, 70, None), rowHeights=30
+        )
+        table.setStyle(table_style)
+        elements.append(table)
+    response = BytesIO()
+    SimpleDocTemplate(response, pagesize=letter).build(elements)
+    return response.getvalue()
+
+
+class Echo:
+    """Буфер, который сразу отдает записанное (для csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def txt_lines(rows, header_table):
+    yield f'{header_table}\n\n'
+    for name, amount, measurement_unit in rows:
+        yield f'{name} ({measurement_unit}) - {amount}\n'
+
+
+def file_lines(rows, header, header_table, file_format):
+    if file_format == 'csv':
+        return csv_lines(rows, header)
+    return txt_lines(rows, header_table)
+
+
+def streaming_file(rows, header, header_table, file_format):
+    """
+    Отдаем csv/txt-файл построчно.
 
-    elements.append(Paragraph(header_table, styles_header_table))
-    elements.append(Spacer(height=30, width=1))
-    elements.append(table)
-    doc.build(elements)
-    return response
+    `rows` - итератор строк, файл не собирается в памяти целиком.
+    """
+    return StreamingHttpResponse(
+        (
+            line.encode()
+            for line in file_lines(rows, header, header_table, file_format)
+        ),
+        headers={
+            'Content-Type': CONTENT_TYPES[file_format],
+            'Content-Disposition': (
+                f'attachment; filename="shopping_list.{file_format}"'
+            )
+        }
+    )
@@ -1,25 +1,75 @@
 """
 Логика работы API.
 """
-from django.db.models import Sum
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (F, Prefetch, Value, Window,
+                              prefetch_related_objects)
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, HttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag, User
-from rest_framework import filters, status, viewsets
+from recipes.models import ExportJob, Ingredient, Recipe, Tag, User
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import FormParser, JSONParser
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from .filters import IngredientFilter, RecipeFilter
-from .mixinset import DeleteObjectMixin
-from .permissions import AuthorOrReadOnly
+from . import metrics
+from .feed import feed
+from .filters import RecipeFilter
+from .importer import RecipeImporter
+from .indexes import ingredient_index
+from .mixinset import CachedResponseMixin, DeleteObjectMixin
+from .negotiation import IgnoreClientContentNegotiation
+from .parsers import JSONMultiPartParser, NDJSONParser
+from .permissions import AuthorOrReadOnly, MetricsPermission
 from .serializers import (CartSerializer, CreateUpdateRecipeSerializer,
-                          CustomUserSerializer, FavoriteSerializer,
-                          GetRecipeSerializer, IngredientSerializer,
-                          RecipeInfoSerializer, SubscribeSerializer,
-                          SubscriptionSerializer, TagSerializer)
-from .utils import pdf_file_table
+                          CustomUserSerializer, ExportJobSerializer,
+                          FavoriteSerializer, GetRecipeSerializer,
+                          IngredientSerializer, RecipeInfoSerializer,
+                          SubscribeSerializer, SubscriptionSerializer,
+                          TagSerializer, recipe_prefetch)
+from .utils import (CONTENT_TYPES, SHOPPING_LIST_CHUNK_SIZE,
+                    SHOPPING_LIST_FORMATS, SHOPPING_LIST_HEADER,
+                    SHOPPING_LIST_TITLE, pdf_file_table, shopping_list,
+                    streaming_file)
+
+
+def get_recipes_limit(request):
+    """Сколько рецептов автора показывать в подписках."""
+    try:
+        return max(int(request.query_params['recipes_limit']), 0)
+    except (KeyError, ValueError):
+        return api_settings.PAGE_SIZE
+
+
+def prefetch_recent_recipes(authors, limit):
+    """
+    Последние `limit` рецептов каждого автора одним запросом.
+
+    Нумеруем рецепты внутри автора оконной функцией ROW_NUMBER;
+    если БД не поддерживает окна, берем все рецепты авторов,
+    а лишние отрезает сериализатор.
+    """
+    recipes = Recipe.objects.order_by('-pub_date')
+    if connection.features.supports_over_clause:
+        recipes = recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author'),
+            order_by=F('pub_date').desc()
+        )).filter(row_number__lte=limit)
+    prefetch_related_objects(authors, Prefetch(
+        'recipes', queryset=recipes, to_attr='recent_recipes'
+    ))
+    return authors
 
 
 class CustomUserViewSet(UserViewSet, DeleteObjectMixin):
@@ -46,11 +96,15 @@ class CustomUserViewSet(UserViewSet, DeleteObjectMixin):
     )
     def subscriptions(self, request):
         """Обрабатывает GET запрос users/subscriptions."""
+        recipes_limit = get_recipes_limit(request)
+        authors = self.paginate_queryset(
+            self.queryset.filter(subscribing__user=request.user).annotate(
+                is_subscribed=Value(True)
+            )
+        )
         serializer = SubscribeSerializer(
-            self.paginate_queryset(self.queryset.filter(
-                subscribing__user=request.user
-            )),
-            context={'request': request},
+            prefetch_recent_recipes(authors, recipes_limit),
+            context={'request': request, 'recipes_limit': recipes_limit},
             many=True
         )
         return self.get_paginated_response(serializer.data)
@@ -59,6 +113,7 @@ class CustomUserViewSet(UserViewSet, DeleteObjectMixin):
         permission_classes=(IsAuthenticated,),
         methods=('post',), detail=True
     )
+    @transaction.atomic
     def subscribe(self, request, id=None):
         """Добавляем автора в подписку."""
         author = self.get_object()
@@ -67,8 +122,13 @@ class CustomUserViewSet(UserViewSet, DeleteObjectMixin):
         )
         if serializer.is_valid(raise_exception=True):
             serializer.save()
+            # Кэш подписок сбросится только после коммита.
+            author.is_subscribed = True
             return Response(
-                SubscribeSerializer(author, context={'request': request}).data,
+                SubscribeSerializer(author, context={
+                    'request': request,
+                    'recipes_limit': get_recipes_limit(request)
+                }).data,
                 status=status.HTTP_201_CREATED
             )
 
@@ -79,23 +139,39 @@ class CustomUserViewSet(UserViewSet, DeleteObjectMixin):
         return self.delete_obj(author.subscribing.filter(user=request.user))
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """Чтение списка/объекта тег."""
+class TagViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """Чтение списка/объекта тег, ответы кэшируются."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
-    """Чтение списка/объекта ингредиент."""
+class IngredientViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Чтение списка/объекта ингредиент, ответы кэшируются.
+
+    Список отдается из индекса в памяти без запросов к БД:
+    ?name= (или ?search=) - поиск по началу названия и с опечатками,
+    ?limit= - ограничение числа результатов.
+    """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
-    search_fields = ('@name',)
-    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.search, request)
+
+    def search(self, request):
+        query = request.query_params.get(
+            'name', request.query_params.get('search', '')
+        )
+        try:
+            limit = max(int(request.query_params['limit']), 0)
+        except (KeyError, ValueError):
+            limit = None
+        return Response(ingredient_index.search(query, limit))
 
 
 class RecipeViewSet(viewsets.ModelViewSet, DeleteObjectMixin):
@@ -103,17 +179,33 @@ class RecipeViewSet(viewsets.ModelViewSet, DeleteObjectMixin):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly, AuthorOrReadOnly)
     http_method_names = ('get', 'post', 'patch', 'delete', 'create')
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'cart_count')
+    parser_classes = (JSONParser, FormParser, JSONMultiPartParser)
+
+    def get_queryset(self):
+        """
+        Для чтения загружаем связанные данные фиксированным числом
+        запросов, независимо от размера страницы. Флаги пользователя
+        (избранное, корзина, подписка) берутся из кэша связей.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'feed'):
+            return queryset
+        return queryset.select_related('author').prefetch_related(
+            *recipe_prefetch()
+        )
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return GetRecipeSerializer
         return CreateUpdateRecipeSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
     def create_obj(self, request, serializer):
         recipe = self.get_object()
         serializer = serializer(
@@ -127,19 +219,109 @@ class RecipeViewSet(viewsets.ModelViewSet, DeleteObjectMixin):
             )
 
     @action(permission_classes=(IsAuthenticated,), detail=False)
+    def feed(self, request):
+        """
+        Лента: рецепты авторов из подписок, новые сначала. Листается
+        по курсору (ссылка next), ?limit= - размер страницы.
+        """
+        user = request.user
+        ids = self.paginator.paginate_positions(
+            lambda position, size: feed(user, position, size), request
+        )
+        return self.paginator.get_paginated_response(self.get_serializer(
+            self.get_queryset().filter(id__in=ids), many=True
+        ).data)
+
+    @action(
+        permission_classes=(IsAdminUser,),
+        methods=('post',), detail=False, url_path='import',
+        parser_classes=(NDJSONParser,)
+    )
+    def import_recipes(self, request):
+        """
+        Пакетный импорт рецептов из NDJSON от имени пользователя.
+
+        ?chunk_size= - размер пачки, в ответе отчет по строкам.
+        """
+        chunk_size = request.query_params.get('chunk_size')
+        if chunk_size is not None:
+            limit = settings.IMPORT_MAX_CHUNK_SIZE
+            try:
+                chunk_size = int(chunk_size)
+            except ValueError:
+                chunk_size = 0
+            if not 1 <= chunk_size <= limit:
+                return Response(
+                    {'errors': f'chunk_size - целое число от 1 до {limit}.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        report = RecipeImporter(
+            request.user, chunk_size=chunk_size
+        ).run(request.data)
+        return Response(
+            report,
+            status=(
+                status.HTTP_201_CREATED if report['created']
+                else status.HTTP_400_BAD_REQUEST
+            )
+        )
+
+    @action(
+        permission_classes=(IsAuthenticated,), detail=False,
+        content_negotiation_class=IgnoreClientContentNegotiation
+    )
     def download_shopping_cart(self, request):
-        """Отдаем файл со списком покупок."""
-        ingredients = list(
-            RecipeIngredient.objects
-            .filter(recipe__recipes_cart__user=request.user)
-            .values('ingredient')
-            .annotate(result=Sum('amount'))
-            .values_list('ingredient__name', 'result',
-                         'ingredient__measurement_unit')
+        """
+        Отдаем файл со списком покупок: ?format=pdf|csv|txt.
+
+        С ?async=1 ставим задачу в очередь и отвечаем 202,
+        файл забирается через download_shopping_cart/jobs/<id>/.
+        """
+        file_format = request.query_params.get('format', 'pdf')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Формат файла: pdf, csv или txt.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if request.query_params.get('async') in ('1', 'true'):
+            job = ExportJob.objects.filter(
+                user=request.user, file_format=file_format,
+                status__in=(ExportJob.PENDING, ExportJob.RUNNING)
+            ).first() or ExportJob.objects.create(
+                user=request.user, file_format=file_format
+            )
+            return Response(
+                ExportJobSerializer(job, context={'request': request}).data,
+                status=status.HTTP_202_ACCEPTED
+            )
+        ingredients = shopping_list(request.user)
+        if file_format == 'pdf':
+            return pdf_file_table(
+                request, data=[SHOPPING_LIST_HEADER, *ingredients],
+                header_table=SHOPPING_LIST_TITLE
+            )
+        return streaming_file(
+            ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE),
+            SHOPPING_LIST_HEADER, SHOPPING_LIST_TITLE, file_format
+        )
+
+    @action(
+        permission_classes=(IsAuthenticated,), detail=False,
+        url_path=r'download_shopping_cart/jobs/(?P<job_id>\d+)',
+        content_negotiation_class=IgnoreClientContentNegotiation
+    )
+    def download_shopping_cart_job(self, request, job_id=None):
+        """Статус фоновой выгрузки, готовый файл отдаем сразу."""
+        job = get_object_or_404(ExportJob, id=job_id, user=request.user)
+        if job.status != ExportJob.DONE:
+            return Response(
+                ExportJobSerializer(job, context={'request': request}).data
+            )
+        return FileResponse(
+            job.file.open('rb'), as_attachment=True,
+            filename=f'shopping_list.{job.file_format}',
+            content_type=CONTENT_TYPES[job.file_format]
         )
-        ingredients.insert(0, ('Ингредиент', 'Кол-во', 'Ед. измерения'))
-        header_table = 'Список покупок.'
-        return pdf_file_table(data=ingredients, header_table=header_table)
 
     @action(
         permission_classes=(IsAuthenticated,),
@@ -170,3 +352,13 @@ class RecipeViewSet(viewsets.ModelViewSet, DeleteObjectMixin):
         return self.delete_obj(
             recipe.recipes_favorite.filter(user=request.user)
         )
+
+
+class MetricsView(APIView):
+    """Метрики запросов процесса в текстовом формате Prometheus."""
+    permission_classes = (MetricsPermission,)
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.registry.export(), content_type=metrics.CONTENT_TYPE
+        )
@@ -0,0 +1,75 @@
+"""
+Пул процессов-обработчиков очереди задач в БД (модели Job).
+"""
+import logging
+import signal
+import time
+from multiprocessing import Process
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+# Как часто обработчик обслуживает очередь (maintain), секунд.
+MAINTENANCE_INTERVAL = 60
+
+
+def run(queue, run_job, job):
+    """Выполняем задачу; любая ошибка переводит ее в FAILED."""
+    try:
+        run_job(job)
+    except Exception as error:
+        logger.exception('Задача %s %s: ошибка.', queue.__name__, job.id)
+        queue.objects.fail(job.id, str(error) or type(error).__name__)
+
+
+def work(queue, run_job, poll_interval, once, maintain=None):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    maintained = None
+    while True:
+        if maintain is not None and (
+            maintained is None
+            or time.monotonic() - maintained >= MAINTENANCE_INTERVAL
+        ):
+            maintain()
+            maintained = time.monotonic()
+        job = queue.objects.claim()
+        if job is not None:
+            run(queue, run_job, job)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def run_pool(command, queue, run_job, workers, poll_interval, once,
+             maintain=None):
+    """
+    Запускаем `workers` процессов, разбирающих очередь `queue`,
+    и ждем их завершения; SIGTERM и SIGINT передаем обработчикам.
+
+    `maintain` (возврат зависших задач, удаление старых) выполняет
+    первый обработчик при запуске и раз в MAINTENANCE_INTERVAL.
+    """
+    if workers <= 1:
+        work(queue, run_job, poll_interval, once, maintain)
+        return
+    connections.close_all()
+    pool = [
+        Process(target=work, args=(
+            queue, run_job, poll_interval, once,
+            maintain if index == 0 else None
+        ))
+        for index in range(workers)
+    ]
+    for process in pool:
+        process.start()
+    command.stdout.write(f'Запущено обработчиков: {workers}.')
+
+    def stop(signum, frame):
+        for process in pool:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in pool:
+        process.join()
@@ -0,0 +1,24 @@
+"""
+Бенчмарки горячих путей API.
+
+Запускаются из каталога backend: `python -m benchmarks.<модуль>`.
+"""
+import os
+
+
+def setup_django(sqlite_path=None):
+    """
+    Настраиваем Django для запуска бенчмарка вне manage.py.
+
+    С `sqlite_path` работаем с отдельной базой SQLite, а не с рабочей.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    if sqlite_path:
+        os.environ['DB_SQLITE'] = 'True'
+        from django.conf import settings
+        settings.DATABASES['default']['NAME'] = sqlite_path
+        if settings.CACHES['default']['BACKEND'].endswith('FileBasedCache'):
+            # Кэш другой базы выдал бы чужие связи и справочники.
+            settings.CACHES['default']['LOCATION'] = f'{sqlite_path}.cache'
+    import django
+    django.setup()
@@ -0,0 +1,73 @@
+"""
+Сравнение двух отчетов benchmarks.suite: изменения p50/p95/p99,
+пропускной способности и числа запросов к БД по сценариям.
+
+    python -m benchmarks.compare before.json after.json --fail-above 10
+
+С --fail-above код выхода 1, если p95 какого-либо сценария вырос
+больше чем на заданный процент или выросло число запросов к БД.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_median')
+
+
+def change(before, after):
+    if before is None or after is None:
+        return None
+    if not before:
+        return 0.0 if not after else float('inf')
+    return (after / before - 1) * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument(
+        '--fail-above', type=float,
+        help='Допустимый рост p95, %%.'
+    )
+    args = parser.parse_args()
+    reports = []
+    for path in (args.before, args.after):
+        with open(path) as file:
+            reports.append(json.load(file))
+    before, after = reports
+    if before['scale'] != after['scale']:
+        print('Внимание: отчеты сняты на разных масштабах данных.')
+    print(f'{before["commit"]} -> {after["commit"]}')
+    regressions = []
+    for mode in ('client', 'http'):
+        if mode not in before or mode not in after:
+            continue
+        print(f'\n{mode}')
+        print(f'{"сценарий":<28}' + ''.join(
+            f'{metric:>16}' for metric in METRICS
+        ))
+        for name, old in before[mode]['scenarios'].items():
+            new = after[mode]['scenarios'].get(name)
+            if new is None:
+                continue
+            cells = []
+            for metric in METRICS:
+                delta = change(old.get(metric), new.get(metric))
+                cells.append(
+                    f'{"-":>16}' if delta is None else f'{delta:>+15.1f}%'
+                )
+            print(f'{name:<28}' + ''.join(cells))
+            if args.fail_above is None:
+                continue
+            if change(old['p95_ms'], new['p95_ms']) > args.fail_above:
+                regressions.append(f'{mode} {name}: p95')
+            if new.get('queries_max', 0) > old.get('queries_max', 0):
+                regressions.append(f'{mode} {name}: запросы к БД')
+    if regressions:
+        print('\nРегрессии:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Синтетические данные для бенчмарков API: пользователи, рецепты,
+ингредиенты рецептов, избранное, корзины и подписки.
+
+Данные детерминированы (`--seed`) и вставляются bulk_create пачками,
+сигналы не срабатывают - производные данные (счетчики, списки
+покупок, поисковый индекс, ленты подписок) пересчитываются в конце
+теми же функциями, что и при обслуживании рабочей базы. База SQLite
+одного масштаба создается один раз и переиспользуется.
+"""
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+
+BATCH_SIZE = 5000
+WORDS = (
+    'соль', 'сахар', 'мука', 'молоко', 'масло', 'яйцо', 'рис', 'гречка',
+    'лук', 'морковь', 'картофель', 'капуста', 'свекла', 'чеснок', 'перец',
+    'томат', 'огурец', 'сыр', 'творог', 'сметана', 'курица', 'говядина',
+    'свинина', 'рыба', 'укроп', 'петрушка', 'яблоко', 'лимон', 'мед',
+)
+SCALE = ('users', 'recipes', 'ingredients', 'per_recipe', 'favorites',
+         'carts', 'subscriptions', 'seed')
+
+
+def add_arguments(parser):
+    """Параметры масштаба: на пользователя - избранное, корзина, подписки."""
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument(
+        '--per-recipe', type=int, default=8, help='Ингредиентов в рецепте.'
+    )
+    parser.add_argument('--favorites', type=int, default=20)
+    parser.add_argument('--carts', type=int, default=5)
+    parser.add_argument('--subscriptions', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--db', help='Файл SQLite (по умолчанию - по параметрам масштаба).'
+    )
+
+
+def scale(args):
+    return {name: getattr(args, name) for name in SCALE}
+
+
+def database_path(args):
+    if args.db:
+        return args.db
+    key = hashlib.sha256(
+        json.dumps(scale(args), sort_keys=True).encode()
+    ).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'foodgram_bench_{key}.sqlite3')
+
+
+def sample(generator, population, count):
+    return generator.sample(population, min(count, len(population)))
+
+
+def bulk(model, objects):
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def generate(args):
+    """
+    Заполняем пустую базу (после migrate), вернем время в секундах.
+    Если в базе уже есть рецепты, считаем ее готовой.
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from recipes import search
+    from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                                RecipeIngredient, ShoppingList, Subscription,
+                                Tag, TimelineEntry, User, recount, tags_mask)
+    from rest_framework.authtoken.models import Token
+
+    call_command('migrate', verbosity=0)
+    if Recipe.objects.exists():
+        return 0.0
+    start = time.perf_counter()
+    generator = random.Random(args.seed)
+    tags = [
+        Tag.objects.create(
+            name=f'Тег {index}', slug=f'tag{index}', color='#FFFFFF'
+        )
+        for index in range(5)
+    ]
+    bulk(Ingredient, (
+        Ingredient(
+            name=f'{WORDS[index % len(WORDS)]} {index}', measurement_unit='г'
+        )
+        for index in range(args.ingredients)
+    ))
+    ingredients = list(Ingredient.objects.values_list('id', flat=True))
+    bulk(User, (
+        User(
+            username=f'user{index}', email=f'user{index}@example.com',
+            first_name='Имя', last_name='Фамилия', password='!'
+        )
+        for index in range(args.users)
+    ))
+    users = list(User.objects.values_list('id', flat=True))
+    bulk(Token, (
+        Token(key=f'{index:040x}', user_id=user_id)
+        for index, user_id in enumerate(users, 1)
+    ))
+    # Авторы неравномерны: у первых пользователей рецептов больше.
+    authors = generator.choices(
+        users, weights=[1 / rank for rank in range(1, len(users) + 1)],
+        k=args.recipes
+    )
+    recipe_tags = [sample(generator, tags, generator.randint(1, 2))
+                   for _ in range(args.recipes)]
+    bulk(Recipe, (
+        Recipe(
+            author_id=author, name=f'Рецепт {index}',
+            text=' '.join(sample(generator, WORDS, 12)),
+            cooking_time=generator.randint(5, 180),
+            tags_mask=tags_mask(tag.bit for tag in recipe_tags[index])
+        )
+        for index, author in enumerate(authors)
+    ))
+    recipes = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+    bulk(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+        for recipe_id, chosen in zip(recipes, recipe_tags) for tag in chosen
+    ))
+    bulk(RecipeIngredient, (
+        RecipeIngredient(
+            recipe_id=recipe_id, ingredient_id=ingredient_id,
+            amount=generator.randint(1, 500)
+        )
+        for recipe_id in recipes
+        for ingredient_id in sample(generator, ingredients, args.per_recipe)
+    ))
+    for model, count in ((Favorite, args.favorites), (Cart, args.carts)):
+        bulk(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in users
+            for recipe_id in sample(generator, recipes, count)
+        ))
+    bulk(Subscription, (
+        Subscription(user_id=user_id, author_id=author_id)
+        for user_id in users
+        for author_id in sample(generator, users, args.subscriptions + 1)
+        if author_id != user_id
+    ))
+    recount()
+    ShoppingList.objects.rebuild()
+    search.reindex()
+    User.objects.filter(
+        subscribers_count__gt=settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    ).update(feed_on_read=True)
+    for user_id in Subscription.objects.order_by().values_list(
+        'user_id', flat=True
+    ).distinct().iterator():
+        bulk(TimelineEntry, (
+            TimelineEntry(user_id=user_id, recipe_id=recipe_id, pub_date=date)
+            for recipe_id, date in Recipe.objects.filter(
+                author__subscribing__user_id=user_id,
+                author__feed_on_read=False
+            ).order_by('-pub_date', '-id').values_list(
+                'id', 'pub_date'
+            )[:settings.FEED_MAX_LENGTH]
+        ))
+    return time.perf_counter() - start
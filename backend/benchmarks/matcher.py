@@ -0,0 +1,134 @@
+"""
+Время подбора рецептов по ингредиентам (?have=).
+
+Индекс строится из сгенерированных пар (рецепт, ингредиент) без БД:
+у каждого рецепта около `--per-recipe` ингредиентов, популярность
+ингредиентов убывает как 1/ранг. Для сравнения тот же подсчет
+делается запросом GROUP BY в SQLite в памяти (--sql).
+
+    python -m benchmarks.matcher --recipes 1000000 --per-recipe 10 --sql
+"""
+import argparse
+import sqlite3
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+
+SQL = '''
+    SELECT pair.recipe_id, COUNT(*) * 1.0 / total.count AS coverage
+    FROM pair JOIN total ON total.recipe_id = pair.recipe_id
+    WHERE pair.ingredient_id IN ({})
+    GROUP BY pair.recipe_id
+    ORDER BY coverage DESC, pair.recipe_id DESC
+    LIMIT ?
+'''
+
+
+def generate(recipes, per_recipe, ingredients):
+    generator = np.random.default_rng(0)
+    weights = 1 / np.arange(1, ingredients + 1)
+    chosen = np.sort(generator.choice(
+        np.arange(1, ingredients + 1), size=(recipes, per_recipe),
+        p=weights / weights.sum()
+    ), axis=1)
+    # Повторы в строке отбрасываем: ингредиентов чуть меньше per_recipe.
+    unique = np.ones(chosen.shape, dtype=bool)
+    unique[:, 1:] = chosen[:, 1:] != chosen[:, :-1]
+    recipe_ids = np.repeat(
+        np.arange(1, recipes + 1, dtype=np.int64)[:, None], per_recipe, axis=1
+    )
+    return recipe_ids[unique], chosen[unique].astype(np.int64)
+
+
+def sqlite_database(recipe_ids, ingredient_ids):
+    database = sqlite3.connect(':memory:')
+    database.execute('CREATE TABLE pair (recipe_id, ingredient_id)')
+    database.executemany(
+        'INSERT INTO pair VALUES (?, ?)',
+        zip(recipe_ids.tolist(), ingredient_ids.tolist())
+    )
+    database.execute('CREATE INDEX pair_ingredient ON pair (ingredient_id)')
+    database.execute(
+        'CREATE TABLE total AS SELECT recipe_id, COUNT(*) AS count '
+        'FROM pair GROUP BY recipe_id'
+    )
+    database.execute('CREATE UNIQUE INDEX total_recipe ON total (recipe_id)')
+    return database
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=1000000)
+    parser.add_argument('--per-recipe', type=int, default=10)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--have', type=int, nargs='+', default=(5, 20, 50))
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--sql', action='store_true', help='Сравнить с GROUP BY в SQLite.'
+    )
+    args = parser.parse_args()
+    setup_django()
+    from api.matcher import RecipeMatcher
+
+    recipe_ids, ingredient_ids = generate(
+        args.recipes, args.per_recipe, args.ingredients
+    )
+    matcher = RecipeMatcher()
+    # Журнал изменений не читаем: индекс строится только из массивов.
+    matcher.sync = lambda: None
+    elapsed, _ = measure(
+        lambda: matcher.fill(recipe_ids, ingredient_ids), 1
+    )
+    print(
+        f'рецептов: {args.recipes}, пар: {len(recipe_ids)}, '
+        f'построение: {elapsed:.0f} мс'
+    )
+    # Каждый раз другой рецепт: меняются и самые длинные массивы.
+    changed = iter(range(1, args.recipes + 1, 997))
+    elapsed, _ = measure(lambda: matcher.set(
+        next(changed), list(range(1, args.per_recipe + 1))
+    ), args.repeat)
+    print(f'изменение рецепта: {elapsed:.2f} мс')
+    database = None
+    if args.sql:
+        database = sqlite_database(recipe_ids, ingredient_ids)
+    generator = np.random.default_rng(1)
+    print(f'{"have":>5} {"найдено":>9} {"индекс, мс":>11} {"SQL, мс":>9}')
+    for size in args.have:
+        # Половина из популярных ингредиентов, половина - случайные.
+        have = sorted(set(
+            range(1, size // 2 + 1)
+        ) | set(generator.integers(
+            1, args.ingredients + 1, size - size // 2
+        ).tolist()))
+        found, _ = matcher.match(have)
+        limited, _ = measure(
+            lambda: matcher.match(have, limit=args.limit), args.repeat
+        )
+        sql = '-'
+        if database is not None:
+            query = SQL.format(', '.join('?' * len(have)))
+            sql_elapsed, _ = measure(
+                lambda: database.execute(
+                    query, (*have, args.limit)
+                ).fetchall(), 1
+            )
+            sql = f'{sql_elapsed:.1f}'
+        print(f'{size:>5} {len(found):>9} {limited:>11.1f} {sql:>9}')
+
+
+if __name__ == '__main__':
+    main()
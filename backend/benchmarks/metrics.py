@@ -0,0 +1,174 @@
+"""
+Накладные расходы MetricsMiddleware (api.metrics).
+
+Два обработчика WSGI в одном процессе - с промежуточным слоем метрик
+и без него - по очереди отвечают на одни и те же запросы к базе SQLite
+со сгенерированными рецептами. Замер чередуется раундами, чтобы оба
+попадали в одинаковые условия (частота CPU, кэш ОС). Разница между
+обработчиками сравнима с шумом, поэтому отдельно печатается время
+самого слоя вокруг пустого ответа.
+
+    python -m benchmarks.metrics --rounds 20 --requests 50
+"""
+import argparse
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+MIDDLEWARE = 'api.middleware.MetricsMiddleware'
+PATHS = (
+    '/api/recipes/?limit=20',
+    '/api/recipes/1/',
+    '/api/tags/',
+    '/api/users/subscriptions/',
+)
+
+
+def generate(recipes):
+    from django.core.management import call_command
+    from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                                Subscription, Tag, User, tags_mask)
+    from rest_framework.authtoken.models import Token
+
+    call_command('migrate', verbosity=0)
+    authors = User.objects.bulk_create(
+        User(
+            username=f'bench{index}', email=f'bench{index}@example.com',
+            first_name='bench', last_name='bench'
+        )
+        for index in range(10)
+    )
+    tags = [
+        Tag.objects.create(name=f'tag{index}', slug=f'tag{index}',
+                           color='#FFFFFF')
+        for index in range(3)
+    ]
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'ingredient{index}', measurement_unit='г')
+        for index in range(50)
+    )
+    created = Recipe.objects.bulk_create(
+        Recipe(
+            author=authors[index % len(authors)], name=f'recipe {index}',
+            text='text', cooking_time=10,
+            tags_mask=tags_mask((tags[0].bit, tags[1].bit))
+        )
+        for index in range(recipes)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe in created for tag in tags[:2]
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe, amount=1,
+            ingredient=ingredients[(recipe.id + offset) % len(ingredients)]
+        )
+        for recipe in created for offset in range(5)
+    )
+    Subscription.objects.bulk_create(
+        Subscription(user=authors[0], author=author)
+        for author in authors[1:]
+    )
+    return Token.objects.create(user=authors[0]).key
+
+
+def handler(with_metrics):
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+
+    middleware = list(settings.MIDDLEWARE)
+    if not with_metrics:
+        middleware.remove(MIDDLEWARE)
+    settings.MIDDLEWARE = middleware
+    return WSGIHandler()
+
+
+def request(wsgi, path, token):
+    path, _, query = path.partition('?')
+    statuses = []
+    response = wsgi({
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'HTTP_AUTHORIZATION': f'Token {token}',
+    }, lambda status, headers: statuses.append(status))
+    b''.join(response)
+    response.close()
+    if not statuses[0].startswith('200'):
+        raise RuntimeError(f'{path}: {statuses[0]}')
+
+
+def measure(wsgi, path, token, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        request(wsgi, path, token)
+    return (time.perf_counter() - start) / count
+
+
+def own_time(count):
+    """Время самого слоя метрик вокруг пустого ответа, мкс."""
+    from api.middleware import MetricsMiddleware
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    response = HttpResponse(b'{}')
+    middleware = MetricsMiddleware(lambda request: response)
+    request = RequestFactory().get('/api/tags/')
+    start = time.perf_counter()
+    for _ in range(count):
+        middleware(request)
+    return (time.perf_counter() - start) / count * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(os.path.join(directory, 'metrics.sqlite3'))
+        from django.conf import settings
+
+        settings.ALLOWED_HOSTS = ['*']
+        token = generate(args.recipes)
+        handlers = {False: handler(False), True: handler(True)}
+        print(f'{"запрос":<28} {"без, мс":>8} {"с, мс":>8} {"разница":>8}')
+        overheads = []
+        for path in PATHS:
+            timings = {False: [], True: []}
+            for wsgi in handlers.values():
+                measure(wsgi, path, token, args.requests)
+            for number in range(args.rounds):
+                # Порядок меняется каждый раунд: второй не выигрывает
+                # от прогрева первым.
+                for with_metrics in (number % 2 == 0, number % 2 == 1):
+                    timings[with_metrics].append(measure(
+                        handlers[with_metrics], path, token, args.requests
+                    ))
+            without, with_ = (
+                statistics.median(timings[key]) * 1000 for key in (False, True)
+            )
+            # Разница по парам соседних замеров устойчивее к дрейфу.
+            overheads.append(statistics.median(
+                after / before - 1
+                for before, after in zip(timings[False], timings[True])
+            ))
+            print(
+                f'{path:<28} {without:>8.2f} {with_:>8.2f} '
+                f'{overheads[-1]:>+8.1%}'
+            )
+        print(f'Средняя разница: {statistics.mean(overheads):+.1%}')
+        print(
+            f'Собственное время слоя: {own_time(100000):.1f} мкс на запрос '
+            '(без учета замера SQL).'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Время ответа ленты рецептов на первой и дальней странице.
+
+`page` - навигация по номеру страницы (OFFSET и COUNT(*) на каждый
+запрос), `cursor` - по курсору (pub_date, id). База SQLite со
+сгенерированными рецептами создается один раз и переиспользуется.
+
+    python -m benchmarks.pagination --recipes 1000000 --pages 1 1000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import setup_django
+
+BATCH_SIZE = 50000
+
+
+def generate(count):
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from recipes.models import Recipe, User
+
+    call_command('migrate', verbosity=0)
+    if Recipe.objects.count() >= count:
+        return
+    Recipe.objects.all().delete()
+    author, _ = User.objects.get_or_create(
+        username='bench', email='bench@example.com',
+        defaults={'first_name': 'bench', 'last_name': 'bench'}
+    )
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    sql = (
+        f'INSERT INTO {Recipe._meta.db_table} (author_id, pub_date, name, '
+        'text, cooking_time, image, favorites_count, cart_count, '
+        'tags_mask, image_variants) '
+        "VALUES (%s, %s, %s, 'text', 10, '', 0, 0, 0, '{}')"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, count, BATCH_SIZE):
+            cursor.executemany(sql, [
+                (
+                    author.id,
+                    # По несколько рецептов на одну дату: проверка id.
+                    (start + timedelta(seconds=index // 3)).isoformat(),
+                    f'recipe {index}'
+                )
+                for index in range(offset, min(offset + BATCH_SIZE, count))
+            ])
+    User.objects.filter(id=author.id).update(recipes_count=count)
+
+
+def cursor_for(page, limit):
+    """Курсор страницы `page`: позиция последней строки предыдущей."""
+    from api.pagination import encode_cursor
+    from recipes.models import Recipe
+
+    if page == 1:
+        return ''
+    pub_date, recipe_id = Recipe.objects.order_by(
+        '-pub_date', '-id'
+    ).values_list('pub_date', 'id')[(page - 1) * limit - 1]
+    return encode_cursor([pub_date, recipe_id])
+
+
+def measure(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=1000000)
+    parser.add_argument('--pages', type=int, nargs='+', default=(1, 1000))
+    parser.add_argument('--limit', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument(
+        '--db', default=os.path.join(tempfile.gettempdir(), 'bench.sqlite3'),
+        help='Файл базы SQLite, переиспользуется между запусками.'
+    )
+    args = parser.parse_args()
+    setup_django(args.db)
+    from django.conf import settings
+    from django.test import Client
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    generate(args.recipes)
+    client = Client()
+    print(f'рецептов: {args.recipes}, limit={args.limit}')
+    print(f'{"страница":>9} {"page, мс":>10} {"cursor, мс":>11}')
+    for page in args.pages:
+        page_url = f'/api/recipes/?page={page}&limit={args.limit}'
+        cursor_url = (
+            f'/api/recipes/?limit={args.limit}'
+            f'&cursor={cursor_for(page, args.limit)}'
+        )
+        print(
+            f'{page:>9} {measure(client, page_url, args.repeat):>10.1f} '
+            f'{measure(client, cursor_url, args.repeat):>11.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Время рендера pdf-файла со списком покупок.
+
+`before` - шрифт и стили создаются заново для каждого документа,
+как было раньше; `after` - берутся из pdf_styles().
+
+    python -m benchmarks.pdf_render --repeat 20
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import setup_django
+
+
+def measure(render, data, repeat, cold):
+    from api.utils import pdf_styles
+
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            pdf_styles.cache_clear()
+        start = time.perf_counter()
+        render(data, 'Список покупок.')
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument(
+        '--rows', type=int, nargs='+', default=(10, 100, 1000)
+    )
+    args = parser.parse_args()
+    setup_django()
+    from api.utils import render_pdf_table
+
+    print(f'{"строк":>6} {"before, мс":>12} {"after, мс":>12}')
+    for rows in args.rows:
+        data = [('Ингредиент', 'Кол-во', 'Ед. измерения')] + [
+            (f'ингредиент {index}', index, 'г') for index in range(rows)
+        ]
+        render_pdf_table(data, 'Список покупок.')
+        before = measure(render_pdf_table, data, args.repeat, cold=True)
+        after = measure(render_pdf_table, data, args.repeat, cold=False)
+        print(f'{rows:>6} {before:>12.1f} {after:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Время поиска рецептов (?search=) по сгенерированной базе SQLite.
+
+Названия и описания собираются из словаря с разной частотой слов:
+запросы проверяют редкое, среднее и частое слово. База создается
+один раз и переиспользуется.
+
+    python -m benchmarks.search --recipes 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import setup_django
+
+BATCH_SIZE = 50000
+# Слово и доля рецептов, в названии которых оно встречается.
+WORDS = (
+    ('суп', 0.1),
+    ('пирог', 0.01),
+    ('окрошка', 0.0001),
+)
+FILLER = (
+    'быстрый', 'домашний', 'простой', 'летний', 'сытный', 'легкий',
+    'праздничный', 'острый', 'сладкий', 'овощной',
+)
+TEXT = (
+    'нарезать', 'смешать', 'посолить', 'варить', 'жарить', 'запекать',
+    'подавать', 'остудить', 'добавить', 'перемешать', 'минут', 'огонь',
+)
+
+
+def recipe_name(generator):
+    words = [generator.choice(FILLER)]
+    for word, share in WORDS:
+        if generator.random() < share:
+            words.append(word)
+    return ' '.join(words)
+
+
+def generate(count):
+    from django.core.management import call_command
+    from django.db import connection, transaction
+    from recipes import search
+    from recipes.models import Recipe, User
+
+    call_command('migrate', verbosity=0)
+    if Recipe.objects.count() >= count:
+        return
+    Recipe.objects.all().delete()
+    author, _ = User.objects.get_or_create(
+        username='bench', email='bench@example.com',
+        defaults={'first_name': 'bench', 'last_name': 'bench'}
+    )
+    generator = random.Random(0)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    sql = (
+        f'INSERT INTO {Recipe._meta.db_table} (author_id, pub_date, name, '
+        'text, cooking_time, image, favorites_count, cart_count, '
+        'tags_mask, image_variants) '
+        "VALUES (%s, %s, %s, %s, 10, '', 0, 0, 0, '{}')"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, count, BATCH_SIZE):
+            cursor.executemany(sql, [
+                (
+                    author.id,
+                    (start + timedelta(seconds=index)).isoformat(),
+                    recipe_name(generator),
+                    ' '.join(generator.choices(TEXT, k=12))
+                )
+                for index in range(offset, min(offset + BATCH_SIZE, count))
+            ])
+        search.reindex()
+    User.objects.filter(id=author.id).update(recipes_count=count)
+
+
+def measure(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content
+    return statistics.median(timings) * 1000, response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument(
+        '--db',
+        default=os.path.join(tempfile.gettempdir(), 'bench_search.sqlite3'),
+        help='Файл базы SQLite, переиспользуется между запусками.'
+    )
+    args = parser.parse_args()
+    setup_django(args.db)
+    from django.conf import settings
+    from django.test import Client
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    generate(args.recipes)
+    client = Client()
+    print(f'рецептов: {args.recipes}, limit={args.limit}')
+    print(f'{"запрос":>10} {"найдено":>9} {"мс":>8}')
+    for word, _ in WORDS:
+        elapsed, data = measure(
+            client, f'/api/recipes/?search={word}&limit={args.limit}',
+            args.repeat
+        )
+        print(f'{word:>10} {data["count"]:>9} {elapsed:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
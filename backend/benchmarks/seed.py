@@ -0,0 +1,55 @@
+"""
+Время загрузки справочников при старте контейнера.
+
+Сравниваем `loaddata dump.json` и `seed dump.json` на пустой базе
+и при повторном запуске (база уже заполнена, файл не менялся).
+
+    python -m benchmarks.seed
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks import setup_django
+
+
+def timed(*command, **options):
+    from django.core.management import call_command
+
+    start = time.perf_counter()
+    call_command(*command, stdout=StringIO(), **options)
+    return time.perf_counter() - start
+
+
+def fresh_database():
+    from django.core.management import call_command
+    from django.db import connection
+
+    connection.close()
+    os.remove(connection.settings_dict['NAME'])
+    call_command('migrate', verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fixture', default='dump.json')
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(), 'seed.sqlite3')
+    setup_django(path)
+    open(path, 'wb').close()
+
+    results = {}
+    for command in ('loaddata', 'seed'):
+        fresh_database()
+        results[command] = (
+            timed(command, args.fixture), timed(command, args.fixture)
+        )
+    print(f'{"команда":>10} {"пустая БД, с":>14} {"повторно, с":>13}')
+    for command, (cold, warm) in results.items():
+        print(f'{command:>10} {cold:>14.3f} {warm:>13.3f}')
+
+
+if __name__ == '__main__':
+    main()
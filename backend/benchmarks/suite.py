@@ -0,0 +1,343 @@
+"""
+Нагрузочный тест горячих путей API на синтетических данных.
+
+Сценарии - ленты и фильтры RecipeViewSet, подписки, поиск ингредиентов
+и выгрузка списка покупок - выполняются двумя способами:
+
+- `client`: тестовый клиент Django в одном процессе, число SQL-запросов
+  на ответ считается обертками connection.execute_wrapper;
+- `http` (с --http): несколько процессов-клиентов в течение --duration
+  секунд шлют запросы gunicorn (запускается сам на свободном порту
+  с той же базой) или уже запущенному серверу (--url).
+
+Результат - JSON с p50/p95/p99, пропускной способностью и числом
+запросов к БД; два файла сравнивает `python -m benchmarks.compare`.
+
+    python -m benchmarks.suite --users 1000 --recipes 10000 \\
+        --http --concurrency 8 --workers 4 --output before.json
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from benchmarks import data, setup_django
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Пользователи, от имени которых идут запросы (по кругу).
+CLIENT_USERS = 100
+SERVER_START_TIMEOUT = 30
+
+
+class Context:
+    """Данные для путей сценариев: id, префиксы, токены."""
+
+    def __init__(self):
+        from recipes.models import Ingredient, Recipe, Tag
+        from rest_framework.authtoken.models import Token
+
+        self.recipes = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[:1000]
+        )
+        self.ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.tags = list(Tag.objects.values_list('slug', flat=True))
+        self.tokens = list(
+            Token.objects.order_by('user_id').values_list('key', flat=True)[
+                :CLIENT_USERS
+            ]
+        )
+
+
+SCENARIOS = {
+    'recipes-list': lambda context, generator: (
+        f'/api/recipes/?page={generator.randint(1, 5)}'
+    ),
+    'recipes-detail': lambda context, generator: (
+        f'/api/recipes/{generator.choice(context.recipes)}/'
+    ),
+    'recipes-favorited': lambda context, generator: (
+        '/api/recipes/?is_favorited=1'
+    ),
+    'recipes-tags': lambda context, generator: (
+        f'/api/recipes/?tags={generator.choice(context.tags)}'
+    ),
+    'recipes-search': lambda context, generator: (
+        f'/api/recipes/?search={generator.choice(data.WORDS)}'
+    ),
+    'recipes-have': lambda context, generator: (
+        '/api/recipes/?have='
+        + ','.join(map(str, generator.sample(context.ingredients, 10)))
+    ),
+    'recipes-feed': lambda context, generator: '/api/recipes/feed/',
+    'users-subscriptions': lambda context, generator: (
+        '/api/users/subscriptions/?recipes_limit=3'
+    ),
+    'ingredients-search': lambda context, generator: (
+        f'/api/ingredients/?name={generator.choice(data.WORDS)[:3]}'
+    ),
+    'download-shopping-cart-txt': lambda context, generator: (
+        '/api/recipes/download_shopping_cart/?format=txt'
+    ),
+    'download-shopping-cart-pdf': lambda context, generator: (
+        '/api/recipes/download_shopping_cart/?format=pdf'
+    ),
+}
+
+
+def plan(name, context, count, seed):
+    """Одни и те же (путь, токен) при каждом запуске с тем же seed."""
+    generator = random.Random(f'{name}:{seed}')
+    return [
+        (
+            SCENARIOS[name](context, generator),
+            context.tokens[index % len(context.tokens)]
+        )
+        for index in range(count)
+    ]
+
+
+def percentile(ordered, quantile):
+    return ordered[max(math.ceil(quantile * len(ordered)) - 1, 0)]
+
+
+def summary(timings, elapsed):
+    ordered = sorted(timings)
+    return {
+        'requests': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'throughput_rps': round(len(ordered) / elapsed, 1),
+    }
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_client(names, context, args):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    results = {}
+    for name in names:
+        requests = plan(name, context, args.warmup + args.requests, args.seed)
+        timings, queries = [], []
+        started = None
+        for index, (path, token) in enumerate(requests):
+            if index == args.warmup:
+                started = time.perf_counter()
+            counter = QueryCounter()
+            start = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                response = client.get(
+                    path, HTTP_AUTHORIZATION=f'Token {token}'
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise SystemExit(f'{name}: {path} - {response.status_code}')
+            if index >= args.warmup:
+                timings.append(elapsed)
+                queries.append(counter.count)
+        results[name] = summary(timings, time.perf_counter() - started)
+        results[name].update(
+            queries_median=statistics.median(queries),
+            queries_max=max(queries),
+        )
+        print(f'client {name}: {results[name]}', file=sys.stderr)
+    return results
+
+
+def http_worker(url, requests, warmup, duration):
+    """Запросы по кругу до истечения `duration`: (время, ошибки)."""
+    address = urlsplit(url)
+    timings, errors = [], 0
+    deadline = None
+    for index in range(sys.maxsize):
+        if index == warmup:
+            deadline = time.monotonic() + duration
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        path, token = requests[index % len(requests)]
+        start = time.perf_counter()
+        connection = http.client.HTTPConnection(
+            address.hostname, address.port, timeout=60
+        )
+        try:
+            connection.request(
+                'GET', path, headers={'Authorization': f'Token {token}'}
+            )
+            response = connection.getresponse()
+            response.read()
+            failed = response.status != 200
+        except OSError:
+            failed = True
+        finally:
+            connection.close()
+        if deadline is not None:
+            timings.append(time.perf_counter() - start)
+            errors += failed
+    return timings, errors
+
+
+def run_http(names, context, args, url):
+    results = {}
+    pool = multiprocessing.get_context('spawn').Pool(args.concurrency)
+    try:
+        for name in names:
+            requests = plan(name, context, args.requests, args.seed)
+            start = time.perf_counter()
+            parts = pool.starmap(http_worker, [
+                (url, requests[index::args.concurrency] or requests,
+                 args.warmup, args.duration)
+                for index in range(args.concurrency)
+            ])
+            # Время замера без прогрева: duration и хвост последних ответов.
+            elapsed = min(time.perf_counter() - start, args.duration) or 1
+            timings = [timing for part, _ in parts for timing in part]
+            results[name] = summary(timings, elapsed)
+            results[name]['errors'] = sum(errors for _, errors in parts)
+            print(f'http {name}: {results[name]}', file=sys.stderr)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(database, workers):
+    if importlib.util.find_spec('gunicorn') is None:
+        raise SystemExit('gunicorn не установлен: pip install gunicorn.')
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--log-level', 'warning',
+            'benchmarks.wsgi',
+        ],
+        cwd=BACKEND_DIR,
+        env=dict(
+            os.environ, BENCHMARK_DB=database,
+            ALLOWED_HOSTS='127.0.0.1 localhost'
+        ),
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit('gunicorn не запустился.')
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    data.add_arguments(parser)
+    parser.add_argument(
+        '--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        '--requests', type=int, default=200,
+        help='Запросов на сценарий (client); длина плана запросов (http).'
+    )
+    parser.add_argument(
+        '--warmup', type=int, default=10,
+        help='Запросов прогрева на сценарий (и на процесс в http).'
+    )
+    parser.add_argument('--http', action='store_true')
+    parser.add_argument('--url', help='Уже запущенный сервер (с --http).')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--output', help='Файл JSON (по умолчанию stdout).')
+    args = parser.parse_args()
+    database = data.database_path(args)
+    setup_django(database)
+    import django
+    from django.conf import settings
+
+    settings.ALLOWED_HOSTS = ['*']
+    generation = data.generate(args)
+    context = Context()
+    report = {
+        'commit': commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': database,
+        'scale': data.scale(args),
+        'generation_seconds': round(generation, 1),
+        'client': {
+            'requests': args.requests,
+            'scenarios': run_client(args.scenarios, context, args),
+        },
+    }
+    if args.http:
+        server = None
+        url = args.url
+        if url is None:
+            server, url = start_gunicorn(database, args.workers)
+        try:
+            report['http'] = {
+                'url': url,
+                'workers': None if args.url else args.workers,
+                'concurrency': args.concurrency,
+                'duration_s': args.duration,
+                'scenarios': run_http(args.scenarios, context, args, url),
+            }
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Загрузка картинки рецепта: base64 в JSON против multipart/form-data.
+
+Каждый способ замеряется в отдельном процессе (Linux): прирост
+пикового RSS после прогрева и медиана времени ответа. Тело запроса
+заранее пишется во временный файл и читается обработчиком WSGI как
+поток, поэтому в память процесса попадает только то, что держит сервер.
+
+    python -m benchmarks.uploads --size 10 --repeat 5
+"""
+import argparse
+import base64
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+BOUNDARY = 'benchmarkboundary'
+
+
+def prepare(size):
+    """База, автор с токеном, тег, ингредиент и картинка-шум."""
+    from django.core.management import call_command
+    from PIL import Image
+    from recipes.models import Ingredient, Tag, User
+    from rest_framework.authtoken.models import Token
+
+    call_command('migrate', verbosity=0)
+    author, _ = User.objects.get_or_create(
+        username='bench', email='bench@example.com',
+        defaults={'first_name': 'bench', 'last_name': 'bench'}
+    )
+    token, _ = Token.objects.get_or_create(user=author)
+    tag, _ = Tag.objects.get_or_create(
+        slug='bench', defaults={'name': 'bench', 'color': '#FFFFFF'}
+    )
+    ingredient, _ = Ingredient.objects.get_or_create(
+        name='bench', measurement_unit='г'
+    )
+    # Шум в PNG почти не сжимается: файл около `size` байт.
+    side = int((size / 3) ** 0.5)
+    image = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+        image, 'PNG', compress_level=0
+    )
+    image.close()
+    fields = {
+        'name': 'bench', 'text': 'bench', 'cooking_time': 10,
+        'tags': [tag.id], 'ingredients': [{'id': ingredient.id, 'amount': 1}],
+    }
+    return token.key, fields, image.name
+
+
+def write_json(fields, image, body):
+    with open(image, 'rb') as file:
+        encoded = base64.b64encode(file.read()).decode()
+    json.dump(
+        dict(fields, image='data:image/png;base64,' + encoded), body
+    )
+    return 'application/json'
+
+
+def write_multipart(fields, image, body):
+    body.write(
+        f'--{BOUNDARY}\r\n'
+        'Content-Disposition: form-data; name="data"\r\n\r\n'
+        f'{json.dumps(fields)}\r\n'
+        f'--{BOUNDARY}\r\n'
+        'Content-Disposition: form-data; name="image"; '
+        'filename="image.png"\r\n'
+        'Content-Type: image/png\r\n\r\n'
+    )
+    body.flush()
+    with open(image, 'rb') as file:
+        body.buffer.write(file.read())
+    body.write(f'\r\n--{BOUNDARY}--\r\n')
+    return f'multipart/form-data; boundary={BOUNDARY}'
+
+
+WRITERS = {'json': write_json, 'multipart': write_multipart}
+
+
+def memory(field):
+    """Поле /proc/self/status (VmRSS, VmHWM - пиковый RSS), МБ."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+
+
+def reset_peak_rss():
+    """Сбрасываем VmHWM до текущего RSS (Linux 4.0+)."""
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def request(handler, method, token, stream=None, content_type='',
+            length=0):
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': '/api/recipes/',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http', 'wsgi.input': stream or io.BytesIO(),
+        'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(length),
+        'HTTP_AUTHORIZATION': f'Token {token}',
+    }
+    statuses = []
+    response = handler(
+        environ, lambda status, headers: statuses.append(status)
+    )
+    b''.join(response)
+    response.close()
+    return statuses[0]
+
+
+def run(sqlite_path, media_root, token, body, content_type, repeat,
+        result):
+    setup_django(sqlite_path)
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+
+    settings.MEDIA_ROOT = media_root
+    settings.ALLOWED_HOSTS = ['*']
+    handler = WSGIHandler()
+    # Прогрев: импорты, соединение с БД, сериализаторы.
+    request(handler, 'GET', token)
+    reset_peak_rss()
+    start_rss = memory('VmRSS')
+    length = os.path.getsize(body)
+    timings = []
+    for _ in range(repeat):
+        with open(body, 'rb') as stream:
+            start = time.perf_counter()
+            status = request(
+                handler, 'POST', token, stream, content_type, length
+            )
+            timings.append(time.perf_counter() - start)
+        if not status.startswith('201'):
+            raise RuntimeError(status)
+    result.put((
+        statistics.median(timings) * 1000, memory('VmHWM') - start_rss
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=float, default=10, help='МБ.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', default=os.path.join(
+        tempfile.gettempdir(), 'foodgram_uploads.sqlite3'
+    ))
+    args = parser.parse_args()
+    setup_django(args.db)
+    token, fields, image = prepare(int(args.size * 1024 * 1024))
+    context = multiprocessing.get_context('spawn')
+    result = context.Queue()
+    print(
+        f'{"способ":>10} {"тело, МБ":>9} {"время, мс":>10} '
+        f'{"прирост RSS, МБ":>16}'
+    )
+    with tempfile.TemporaryDirectory() as media_root:
+        for mode, write in WRITERS.items():
+            with tempfile.NamedTemporaryFile('w+', suffix='.body') as body:
+                content_type = write(fields, image, body)
+                body.flush()
+                process = context.Process(target=run, args=(
+                    args.db, media_root, token, body.name, content_type,
+                    args.repeat, result
+                ))
+                process.start()
+                process.join()
+                if process.exitcode:
+                    raise SystemExit(f'{mode}: ошибка в процессе замера.')
+                elapsed, grown = result.get()
+                length = os.path.getsize(body.name) / 1024 / 1024
+            print(
+                f'{mode:>10} {length:>9.1f} {elapsed:>10.0f} {grown:>16.1f}'
+            )
+    os.unlink(image)
+
+
+if __name__ == '__main__':
+    main()
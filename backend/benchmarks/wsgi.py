@@ -0,0 +1,14 @@
+"""
+WSGI-приложение нагрузочного теста: база SQLite из BENCHMARK_DB.
+
+    BENCHMARK_DB=/tmp/foodgram_bench.sqlite3 gunicorn benchmarks.wsgi
+"""
+import os
+
+from benchmarks import setup_django
+
+setup_django(os.environ['BENCHMARK_DB'])
+
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+
+application = get_wsgi_application()
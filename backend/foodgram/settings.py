@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,47 @@ else:
     }
 }
 
+# Кэш должен быть общим для всех процессов (воркеры gunicorn, фоновые
+# сервисы, manage.py): по умолчанию файловый, в docker compose - том
+# cache_volume. На кэш в памяти процесса (LocMemCache) - предупреждение
+# проверки api.W001.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/var/tmp/foodgram_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+        },
+    }
+}
+
+# Кэш ответов справочников (теги, ингредиенты).
+REFERENCE_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+REFERENCE_CACHE_MAX_AGE = int(os.getenv('REFERENCE_CACHE_MAX_AGE', 60))
+
+# Кэш связей пользователя (избранное, корзина, подписки): не больше
+# RELATIONS_CACHE_MAX_IDS id каждого вида, 8 байт на id.
+RELATIONS_CACHE_MAX_IDS = int(os.getenv('RELATIONS_CACHE_MAX_IDS', 10000))
+RELATIONS_CACHE_TIMEOUT = int(
+    os.getenv('RELATIONS_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+
+# Подбор по ингредиентам (?have=): сколько лучших рецептов отдавать.
+MATCH_MAX_RESULTS = int(os.getenv('MATCH_MAX_RESULTS', 1000))
+
+# Лента подписок: сколько записей хранить на пользователя и с какого
+# числа подписчиков рецепты автора читаются при запросе, а не
+# раскладываются по лентам.
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', 1000))
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', 10000)
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -123,6 +165,52 @@ STATIC_ROOT = BASE_DIR / 'backend_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / '/var/www/foodgram/media/'
 
+# Кэш pdf-файлов со списком покупок: каталог вне MEDIA_ROOT (его nginx
+# отдает всем), лимиты памяти процесса и места на диске.
+SHOPPING_LIST_CACHE_DIR = os.getenv(
+    'SHOPPING_LIST_CACHE_DIR', '/var/tmp/foodgram_shopping_lists'
+)
+SHOPPING_LIST_CACHE_SIZE = int(
+    os.getenv('SHOPPING_LIST_CACHE_SIZE', 32 * 1024 * 1024)
+)
+SHOPPING_LIST_CACHE_DISK_SIZE = int(
+    os.getenv('SHOPPING_LIST_CACHE_DISK_SIZE', 512 * 1024 * 1024)
+)
+
+# Фоновая выгрузка списков покупок (manage.py export_worker).
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+EXPORT_POLL_INTERVAL = float(os.getenv('EXPORT_POLL_INTERVAL', 1))
+EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', 10 * 60))
+EXPORT_JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', 24 * 60 * 60))
+# Готовые файлы выгрузки: не в MEDIA_ROOT, общий каталог бэкенда и
+# export_worker.
+EXPORT_FILES_DIR = os.getenv('EXPORT_FILES_DIR', '/var/www/foodgram/exports/')
+
+# Размер пачки при импорте рецептов из NDJSON: по умолчанию и наибольший
+# (?chunk_size=, --chunk-size).
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+IMPORT_MAX_CHUNK_SIZE = int(os.getenv('IMPORT_MAX_CHUNK_SIZE', 5000))
+
+# Картинки рецептов: предел размера (как client_max_body_size в nginx),
+# превью - наибольшая сторона в пикселях, обработчики manage.py
+# image_worker.
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', 20 * 1024 * 1024))
+IMAGE_VARIANTS = {'small': 320, 'medium': 960}
+IMAGE_SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True},
+    'WEBP': {'quality': 80, 'method': 4},
+}
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_POLL_INTERVAL = float(os.getenv('IMAGE_POLL_INTERVAL', 1))
+IMAGE_JOB_TIMEOUT = int(os.getenv('IMAGE_JOB_TIMEOUT', 10 * 60))
+
+# Метрики запросов (/api/_metrics): токен Prometheus (пусто - только
+# администраторам), порог медленного запроса в мс и сколько его SQL
+# писать в лог.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_SLOW_REQUEST_MS = int(os.getenv('METRICS_SLOW_REQUEST_MS', 1000))
+METRICS_SLOW_SQL_LIMIT = int(os.getenv('METRICS_SLOW_SQL_LIMIT', 10))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
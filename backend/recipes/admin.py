@@ -9,12 +9,14 @@ from django.utils.html import format_html
 from django.utils.http import urlencode
 
 from . import models
+from .signals import recipes_changed
 
 
 @admin.register(models.User)
 class UserAdmin(admin.ModelAdmin):
     list_display = (
-        'pk', 'username', 'email', 'first_name', 'last_name'
+        'pk', 'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'subscribers_count'
     )
     list_filter = ('username', 'email')
     search_fields = ('username', 'email')
@@ -33,7 +35,13 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'measurement_unit')
     list_editable = ('name', 'measurement_unit')
     list_filter = ('name', )
-    search_fields = ('name', )
+    search_fields = ('^name', )
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по началу названия через индекс lower(name)."""
+        if not search_term:
+            return queryset, False
+        return queryset.name_prefix(search_term), False
 
 
 @admin.register(models.Tag)
@@ -75,8 +83,16 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     inlines = (RecipeIngredientInline,)
 
+    def save_related(self, request, form, formsets, change):
+        old_amounts = models.ShoppingList.objects.amounts(form.instance)
+        super().save_related(request, form, formsets, change)
+        models.ShoppingList.objects.update_recipe(form.instance, old_amounts)
+        recipes_changed.send(
+            sender=models.Recipe, recipe_ids=(form.instance.id,)
+        )
+
     def in_favorites(self, obj):
-        count = obj.recipes_favorite.count()
+        count = obj.favorites_count
         url = (
             reverse("admin:recipes_favorite_changelist")
             + "?"
@@ -85,6 +101,7 @@ class RecipeAdmin(admin.ModelAdmin):
         return format_html('<a href="{}">{} пользователь</a>', url, count)
 
     in_favorites.short_description = 'В избранном'
+    in_favorites.admin_order_field = 'favorites_count'
 
     def tag(self, obj):
         return list(obj.tags.all())
@@ -98,6 +115,12 @@ class CartAdmin(admin.ModelAdmin):
     list_editable = ('user', 'recipe')
 
 
+@admin.register(models.ShoppingList)
+class ShoppingListAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    list_filter = ('user',)
+
+
 @admin.register(models.Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
@@ -0,0 +1,39 @@
+"""
+Пересборка и сверка материализованных списков покупок.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import ShoppingList
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает списки покупок по корзинам пользователей. '
+        'С --check только сверяет их с корзинами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя (можно указать несколько раз).'
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить, ничего не изменяя.'
+        )
+
+    def handle(self, *args, users=None, check=False, **options):
+        mismatches = ShoppingList.objects.mismatches(users)
+        for (user, ingredient), (stored, live) in sorted(mismatches.items()):
+            self.stdout.write(
+                f'user={user} ingredient={ingredient}: '
+                f'хранится {stored}, по корзинам {live}'
+            )
+        if check:
+            if mismatches:
+                raise CommandError(f'Расхождений: {len(mismatches)}.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        ShoppingList.objects.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны, исправлено {len(mismatches)}.'
+        ))
@@ -0,0 +1,35 @@
+"""
+Пересчет и сверка счетчиков рецептов и пользователей.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import counter_mismatches, recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного, корзин, рецептов и '
+        'подписчиков по связям. С --check только сверяет их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить, ничего не изменяя.'
+        )
+
+    def handle(self, *args, check=False, **options):
+        mismatches = counter_mismatches()
+        for (model, field, pk), (stored, live) in sorted(mismatches.items()):
+            self.stdout.write(
+                f'{model} id={pk} {field}: хранится {stored}, '
+                f'по связям {live}'
+            )
+        if check:
+            if mismatches:
+                raise CommandError(f'Расхождений: {len(mismatches)}.')
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+            return
+        recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны, исправлено {len(mismatches)}.'
+        ))
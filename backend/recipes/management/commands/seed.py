@@ -0,0 +1,132 @@
+"""
+Идемпотентная загрузка справочников тегов и ингредиентов.
+"""
+import hashlib
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import Fixture, Ingredient, Tag
+from recipes.signals import reference_data_changed
+
+READ_SIZE = 64 * 1024
+
+
+def file_checksum(path):
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(READ_SIZE):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def iter_objects(file):
+    """Объекты JSON-массива по одному, файл не читается целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив объектов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Файл обрывается посреди объекта.')
+            buffer += chunk
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает теги и ингредиенты из фикстуры (формат dumpdata). '
+        'Добавляет только недостающее, неизмененный файл пропускает.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл фикстуры, например dump.json.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Сверить данные, даже если файл не менялся.'
+        )
+
+    def handle(self, *args, path, force, **options):
+        name = os.path.basename(path)
+        checksum = file_checksum(path)
+        if not force and Fixture.objects.filter(
+            name=name, checksum=checksum
+        ).exists():
+            self.stdout.write(f'{name} не изменился, пропускаем.')
+            return
+        tags, ingredients = {}, {}
+        with open(path, encoding='utf-8') as file:
+            for obj in iter_objects(file):
+                fields = obj.get('fields', {})
+                if obj.get('model') == 'recipes.tag':
+                    tags[fields['slug']] = fields
+                elif obj.get('model') == 'recipes.ingredient':
+                    ingredients[
+                        fields['name'], fields['measurement_unit']
+                    ] = None
+                else:
+                    raise CommandError(
+                        f'Неподдерживаемая модель: {obj.get("model")}.'
+                    )
+        with transaction.atomic():
+            created_tags, updated_tags = self.save_tags(tags)
+            created_ingredients = self.save_ingredients(ingredients)
+            Fixture.objects.update_or_create(
+                name=name, defaults={'checksum': checksum}
+            )
+        changed = tuple(
+            model for model, count in (
+                (Tag, created_tags + updated_tags),
+                (Ingredient, created_ingredients)
+            ) if count
+        )
+        if changed:
+            reference_data_changed.send(sender=self.__class__, models=changed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Теги: добавлено {created_tags}, обновлено {updated_tags}. '
+            f'Ингредиенты: добавлено {created_ingredients}.'
+        ))
+
+    def save_tags(self, tags):
+        existing = Tag.objects.in_bulk(tags, field_name='slug')
+        created, updated = [], []
+        for slug, fields in tags.items():
+            tag = existing.get(slug)
+            if tag is None:
+                created.append(Tag(**fields))
+                continue
+            changed = False
+            for field, value in fields.items():
+                if getattr(tag, field) != value:
+                    setattr(tag, field, value)
+                    changed = True
+            if changed:
+                updated.append(tag)
+        for tag, bit in zip(created, Tag.objects.free_bits(len(created))):
+            tag.bit = bit
+        Tag.objects.bulk_create(created)
+        Tag.objects.bulk_update(updated, ('name', 'color'))
+        return len(created), len(updated)
+
+    def save_ingredients(self, ingredients):
+        existing = set(Ingredient.objects.order_by().values_list(
+            'name', 'measurement_unit'
+        ))
+        created = [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in ingredients
+            if (name, measurement_unit) not in existing
+        ]
+        Ingredient.objects.bulk_create(created, batch_size=1000)
+        return len(created)
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.4 on 2026-10-17 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fixture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Файл')),
+                ('checksum', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('loaded', models.DateTimeField(auto_now=True, verbose_name='Загружен')),
+            ],
+            options={
+                'verbose_name': 'Загруженный справочник',
+                'verbose_name_plural': 'Загруженные справочники',
+                'ordering': ('name',),
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.4 on 2026-10-17 01:42
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Favorite', 'Recipe', 'favorites_count', 'recipe_id'),
+    ('Cart', 'Recipe', 'cart_count', 'recipe_id'),
+    ('Recipe', 'User', 'recipes_count', 'author_id'),
+    ('Subscription', 'User', 'subscribers_count', 'author_id'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for related, model, field, foreign_key in COUNTERS:
+        related = apps.get_model('recipes', related)
+        apps.get_model('recipes', model).objects.update(**{
+            field: Coalesce(models.Subquery(
+                related.objects.filter(**{foreign_key: models.OuterRef('pk')})
+                .order_by().values(foreign_key)
+                .annotate(count=models.Count('*')).values('count')
+            ), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_fixture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
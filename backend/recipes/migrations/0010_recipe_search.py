@@ -0,0 +1,99 @@
+import re
+
+from django.db import migrations
+
+# Копия правил recipes.search на момент миграции: модуль может
+# измениться, миграция - нет.
+FTS_TABLE = 'recipes_recipe_fts'
+ENDING = re.compile(r'(?<=\w{3})[аеиоуыэюяйь]+$')
+CHUNK_SIZE = 500
+
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+    "name, text, ingredients, tokenize = 'unicode61 remove_diacritics 2')"
+)
+SQLITE_INSERT = (
+    f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+    'VALUES (%s, %s, %s, %s)'
+)
+POSTGRESQL_CREATE = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+)
+POSTGRESQL_UPDATE = '''
+    UPDATE recipes_recipe recipe SET search_vector =
+        setweight(to_tsvector(
+            'russian', translate(recipe.name, 'ёЁ', 'еЕ')
+        ), 'A')
+        || setweight(to_tsvector('russian', COALESCE((
+            SELECT string_agg(translate(ingredient.name, 'ёЁ', 'еЕ'), ' ')
+            FROM recipes_recipeingredient amount
+            JOIN recipes_ingredient ingredient
+                ON ingredient.id = amount.ingredient_id
+            WHERE amount.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector(
+            'russian', translate(recipe.text, 'ёЁ', 'еЕ')
+        ), 'C')
+'''
+
+
+def stem(value):
+    return ' '.join(
+        ENDING.sub('', word)
+        for word in re.findall(r'\w+', value.lower().replace('ё', 'е'))
+    )
+
+
+def index_sqlite(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    recipes = Recipe.objects.order_by('id').values_list('id', 'name', 'text')
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, recipes.count(), CHUNK_SIZE):
+            chunk = list(recipes[start:start + CHUNK_SIZE])
+            ingredients = {}
+            for recipe_id, name in RecipeIngredient.objects.filter(
+                recipe_id__in=[recipe_id for recipe_id, _, _ in chunk]
+            ).values_list('recipe_id', 'ingredient__name'):
+                ingredients.setdefault(recipe_id, []).append(name)
+            cursor.executemany(SQLITE_INSERT, [
+                (
+                    recipe_id, stem(name), stem(text),
+                    stem(' '.join(ingredients.get(recipe_id, ())))
+                )
+                for recipe_id, name, text in chunk
+            ])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        index_sqlite(apps, schema_editor)
+    elif vendor == 'postgresql':
+        for sql in POSTGRESQL_CREATE:
+            schema_editor.execute(sql)
+        schema_editor.execute(POSTGRESQL_UPDATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN search_vector'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
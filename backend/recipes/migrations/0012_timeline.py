@@ -0,0 +1,63 @@
+# Generated by Django 4.2.4 on 2026-10-17 02:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    """Ленты существующих подписчиков: последние рецепты авторов."""
+    Subscription = apps.get_model('recipes', 'Subscription')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    apps.get_model('recipes', 'User').objects.filter(
+        subscribers_count__gt=settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    ).update(feed_on_read=True)
+    users = Subscription.objects.order_by().values_list(
+        'user_id', flat=True
+    ).distinct()
+    for user_id in users.iterator():
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user_id=user_id, recipe_id=recipe_id, pub_date=date)
+            for recipe_id, date in Recipe.objects.filter(
+                author__subscribing__user_id=user_id,
+                author__feed_on_read=False
+            ).order_by('-pub_date', '-id').values_list(
+                'id', 'pub_date'
+            )[:settings.FEED_MAX_LENGTH]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_tags_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_on_read',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Лента: чтение при запросе'),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+                'ordering': ('id',),
+                'indexes': [models.Index(fields=['user', '-pub_date', '-recipe'], name='timeline_user_pub_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
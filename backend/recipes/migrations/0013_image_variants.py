@@ -0,0 +1,50 @@
+# Generated by Django 4.2.4 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+def enqueue_images(apps, schema_editor):
+    """Превью и WebP для уже загруженных картинок строит image_worker."""
+    ImageJob = apps.get_model('recipes', 'ImageJob')
+    images = apps.get_model('recipes', 'Recipe').objects.exclude(
+        image=''
+    ).exclude(image=None).order_by().values_list('image', flat=True)
+    ImageJob.objects.bulk_create(
+        (ImageJob(image=image) for image in images.distinct().iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Варианты изображения'),
+        ),
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=7, verbose_name='Статус')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлена')),
+                ('image', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('variants', models.JSONField(blank=True, default=dict, verbose_name='Варианты')),
+            ],
+            options={
+                'verbose_name': 'Задача обработки картинки',
+                'verbose_name_plural': 'Задачи обработки картинок',
+                'ordering': ('created',),
+                'abstract': False,
+                'indexes': [models.Index(fields=['status', 'created'], name='imagejob_status_idx')],
+            },
+        ),
+        migrations.RunPython(enqueue_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.4 on 2026-10-17 03:04
+
+from django.db import migrations, models
+import recipes.storage
+
+
+def drop_public_exports(apps, schema_editor):
+    """
+    Готовые файлы лежали в MEDIA_ROOT, в новом хранилище их нет:
+    задачи удаляем, выгрузку пользователь запросит заново.
+    """
+    apps.get_model('recipes', 'ExportJob').objects.filter(
+        status='done'
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=recipes.storage.export_storage, upload_to='jobs/', verbose_name='Файл'),
+        ),
+        migrations.RunPython(drop_public_exports, migrations.RunPython.noop),
+    ]
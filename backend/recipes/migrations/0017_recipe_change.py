@@ -0,0 +1,27 @@
+# Generated by Django 4.2.4 on 2026-10-17 03:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_ids', models.JSONField(verbose_name='Рецепты')),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Записано')),
+            ],
+            options={
+                'verbose_name': 'Изменение рецептов',
+                'verbose_name_plural': 'Журнал изменений рецептов',
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -1,22 +1,68 @@
 """
 Настройка моделей проекта.
 """
+from itertools import combinations
+
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest, Lower
+from django.utils import timezone
 from foodgram.settings import AUTH_USER_MODEL
 
+from .storage import ContentAddressedStorage, export_storage
+
 RECIPE_DATA = '{name} - {author} - {date:%d.%m.%Y}'
 SUBSCRIPTIONS_DATA = '{user} подписан на {author}'
 USER_DATA = '{username} - {email} - {first_name} {last_name}'
 MAX_LENGTH_EMAIL = 254
 MAX_LENGTH_FIELD = 200
 MAX_LENGTH_NAME_USER = 150
+# Биты маски тегов: 0..62, знаковый bigint остается положительным.
+MAX_TAGS = 63
+# До скольких тегов подходящие маски перечисляются для IN.
+MAX_ENUMERATED_TAGS = 8
+
+
+def tags_mask(bits):
+    """Маска тегов по их битам."""
+    mask = 0
+    for bit in bits:
+        mask |= 1 << bit
+    return mask
+
+
+def subsets(bits):
+    return [
+        subset for size in range(len(bits) + 1)
+        for subset in combinations(bits, size)
+    ]
+
+
+class CountersMixin:
+    """
+    Счетчики модели (COUNTERS, с ними и флаги, которые ставятся
+    только update()) меняются запросами UPDATE: сохранение
+    существующего объекта их не пишет, иначе устаревшие значения
+    в памяти затерли бы чужие изменения.
+    """
+    COUNTERS = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding:
+            skipped = set(self.COUNTERS) | self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+                and field.attname not in skipped
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
 
 
-class User(AbstractUser):
+class User(CountersMixin, AbstractUser):
     """Модель Пользователя."""
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
@@ -33,6 +79,20 @@ class User(AbstractUser):
     last_name = models.CharField(
         'Фамилия', blank=False, null=False, max_length=MAX_LENGTH_NAME_USER
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
+    # Рецепты автора не раскладываются по лентам подписчиков, а читаются
+    # при запросе ленты. Ставится, когда подписчиков становится больше
+    # FEED_FANOUT_MAX_SUBSCRIBERS, и не снимается.
+    feed_on_read = models.BooleanField(
+        'Лента: чтение при запросе', default=False, editable=False
+    )
+
+    COUNTERS = ('recipes_count', 'subscribers_count', 'feed_on_read')
 
     class Meta:
         ordering = ('id',)
@@ -88,6 +148,17 @@ class Subscription(models.Model):
             )
 
 
+class TagQuerySet(models.QuerySet):
+
+    def free_bits(self, count):
+        """Первые `count` свободных битов маски тегов."""
+        used = set(self.model.objects.values_list('bit', flat=True))
+        free = [bit for bit in range(MAX_TAGS) if bit not in used][:count]
+        if len(free) < count:
+            raise ValidationError(f'Тегов не может быть больше {MAX_TAGS}.')
+        return free
+
+
 class Tag(models.Model):
     """Модель Тег."""
     name = models.CharField(
@@ -100,6 +171,11 @@ class Tag(models.Model):
         ),
     ))
     slug = models.SlugField('Метка', unique=True, max_length=MAX_LENGTH_FIELD)
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов', unique=True, editable=False
+    )
+
+    objects = TagQuerySet.as_manager()
 
     class Meta:
         ordering = ('name',)
@@ -109,6 +185,29 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.bit is None:
+            Tag.objects.free_bits(1)
+
+
+class IngredientQuerySet(models.QuerySet):
+
+    def name_prefix(self, prefix):
+        """
+        Ингредиенты, название которых начинается с `prefix` без учета
+        регистра. Диапазон по lower(name) идет по индексу
+        ingredient_lower_name_idx, LIKE лишь уточняет его.
+        """
+        prefix = prefix.lower()
+        queryset = self.annotate(lower_name=Lower('name'))
+        if not prefix:
+            return queryset
+        return queryset.filter(
+            lower_name__gte=prefix,
+            lower_name__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1),
+            lower_name__startswith=prefix
+        )
+
 
 class Ingredient(models.Model):
     """Модель Ингредиент."""
@@ -119,8 +218,13 @@ class Ingredient(models.Model):
         'Ед.измерения', blank=False, null=False, max_length=MAX_LENGTH_FIELD
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         ordering = ('name',)
+        indexes = (
+            models.Index(Lower('name'), name='ingredient_lower_name_idx'),
+        )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         constraints = [
@@ -134,7 +238,57 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_tags(self, bits, match_all=False):
+        """
+        Рецепты с любым из тегов `bits` (match_all - со всеми).
+
+        Пока тегов немного, перечисляем все подходящие значения
+        tags_mask: условие IN идет по индексу recipe_tags_mask_idx.
+        Иначе - побитовое И по каждой строке.
+        """
+        bits = sorted(set(bits))
+        if not bits:
+            return self
+        selected = tags_mask(bits)
+        others = [
+            bit for bit in Tag.objects.values_list('bit', flat=True)
+            if bit not in bits
+        ]
+        if len(bits) + len(others) > MAX_ENUMERATED_TAGS:
+            queryset = self.alias(
+                selected_tags=F('tags_mask').bitand(selected)
+            )
+            if match_all:
+                return queryset.filter(selected_tags=selected)
+            return queryset.filter(selected_tags__gt=0)
+        required = [selected] if match_all else [
+            tags_mask(subset) for subset in subsets(bits) if subset
+        ]
+        return self.filter(tags_mask__in=[
+            mask | tags_mask(subset)
+            for mask in required for subset in subsets(others)
+        ])
+
+    def update_tags_mask(self):
+        """Пересчитываем tags_mask по связям с тегами, вернем маски."""
+        masks = dict.fromkeys(self.values_list('id', flat=True), 0)
+        for recipe_id, bit in self.model.tags.through.objects.filter(
+            recipe_id__in=masks
+        ).values_list('recipe_id', 'tag__bit'):
+            masks[recipe_id] |= 1 << bit
+        groups = {}
+        for recipe_id, mask in masks.items():
+            groups.setdefault(mask, []).append(recipe_id)
+        for mask, recipe_ids in groups.items():
+            self.model.objects.filter(id__in=recipe_ids).update(
+                tags_mask=mask
+            )
+        return masks
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель Рецепт."""
     REQUIRED_FIELDS = [
         'tags',
@@ -172,12 +326,49 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Изображение',
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
         null=True,
         default=None
     )
+    # Превью и WebP картинки (manage.py image_worker): вариант - имя файла.
+    image_variants = models.JSONField(
+        'Варианты изображения', default=dict, blank=True, editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False
+    )
+    # Биты тегов рецепта (Tag.bit): фильтр по тегам без JOIN.
+    tags_mask = models.BigIntegerField(
+        'Маска тегов', default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTERS = ('favorites_count', 'cart_count')
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            # Лента рецептов и навигация по курсору (pub_date, id).
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+            # Рецепты автора (страница автора, подписки).
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+            # Фильтр по тегам: tags_mask IN (...).
+            models.Index(
+                fields=('tags_mask', '-pub_date', '-id'),
+                name='recipe_tags_mask_idx'
+            ),
+            # Рецепты с картинкой: варианты (image_worker) и gc_media.
+            models.Index(fields=('image',), name='recipe_image_idx'),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -187,6 +378,26 @@ class Recipe(models.Model):
         )
 
 
+class RecipeSearchDocument(models.Model):
+    """
+    Строка индекса FTS5 (только SQLite, таблицу создает миграция
+    0010, пишет recipes.search): через связь поиск соединяет индекс
+    с рецептами.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search_document',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
+
+
 class RecipeIngredient(models.Model):
     """Модель связи id рецепта и id ингредиента."""
 
@@ -269,3 +480,408 @@ class Favorite(CreatedModel):
     class Meta(CreatedModel.Meta):
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избраные рецепты'
+
+
+class ShoppingListManager(models.Manager):
+    """Инкрементальное обслуживание материализованного списка покупок."""
+
+    @staticmethod
+    def amounts(recipe):
+        """Кол-во каждого ингредиента в рецепте."""
+        return dict(
+            RecipeIngredient.objects.filter(recipe=recipe)
+            .order_by().values_list('ingredient_id', 'amount')
+        )
+
+    @staticmethod
+    def lock(users):
+        """
+        Блокируем строки пользователей: select_for_update по списку
+        покупок не видит еще не созданные строки, и две параллельные
+        вставки одного ингредиента нарушили бы unique_shoppinglist.
+        """
+        list(
+            User.objects.select_for_update().filter(id__in=users)
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def apply(self, deltas):
+        """Применяем изменения {(user_id, ingredient_id): delta}."""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        with transaction.atomic():
+            self.lock({user for user, _ in deltas})
+            items = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.order_by().filter(
+                    user__in={user for user, _ in deltas},
+                    ingredient__in={ingredient for _, ingredient in deltas}
+                )
+            }
+            created, updated, deleted = [], [], []
+            for (user, ingredient), delta in deltas.items():
+                item = items.get((user, ingredient))
+                if item is None:
+                    if delta > 0:
+                        created.append(self.model(
+                            user_id=user, ingredient_id=ingredient,
+                            amount=delta
+                        ))
+                    continue
+                item.amount += delta
+                if item.amount > 0:
+                    updated.append(item)
+                else:
+                    deleted.append(item.id)
+            self.bulk_create(created)
+            self.bulk_update(updated, ('amount',))
+            self.filter(id__in=deleted).delete()
+
+    def add_recipe(self, recipe, users):
+        """Рецепт добавлен в корзины пользователей."""
+        amounts = self.amounts(recipe)
+        self.apply({
+            (user, ingredient): amount
+            for user in users for ingredient, amount in amounts.items()
+        })
+
+    def remove_recipe(self, recipe, users=None):
+        """Рецепт удален из корзин (по умолчанию - из всех)."""
+        if users is None:
+            users = Cart.objects.filter(recipe=recipe).values_list(
+                'user', flat=True
+            )
+        amounts = self.amounts(recipe)
+        self.apply({
+            (user, ingredient): -amount
+            for user in users for ingredient, amount in amounts.items()
+        })
+
+    def update_recipe(self, recipe, old_amounts, new_amounts=None):
+        """Ингредиенты рецепта изменились: переносим разницу в корзины."""
+        if new_amounts is None:
+            new_amounts = self.amounts(recipe)
+        changes = {
+            ingredient: (
+                new_amounts.get(ingredient, 0)
+                - old_amounts.get(ingredient, 0)
+            ) for ingredient in new_amounts.keys() | old_amounts.keys()
+        }
+        self.apply({
+            (user, ingredient): delta
+            for user in Cart.objects.filter(recipe=recipe).values_list(
+                'user', flat=True
+            ) for ingredient, delta in changes.items()
+        })
+
+    def aggregate(self, users=None):
+        """Список покупок, посчитанный по корзинам."""
+        rows = RecipeIngredient.objects.order_by()
+        if users is None:
+            rows = rows.filter(recipe__recipes_cart__isnull=False)
+        else:
+            rows = rows.filter(recipe__recipes_cart__user__in=users)
+        return {
+            (user, ingredient): amount
+            for user, ingredient, amount in rows.values(
+                'recipe__recipes_cart__user', 'ingredient'
+            ).annotate(total=Sum('amount')).values_list(
+                'recipe__recipes_cart__user', 'ingredient', 'total'
+            )
+        }
+
+    def stored(self, users=None):
+        """Материализованный список покупок."""
+        items = self.order_by()
+        if users is not None:
+            items = items.filter(user__in=users)
+        return {
+            (user, ingredient): amount
+            for user, ingredient, amount in items.values_list(
+                'user', 'ingredient', 'amount'
+            )
+        }
+
+    def mismatches(self, users=None):
+        """Расхождения {(user_id, ingredient_id): (хранится, по корзинам)}."""
+        stored = self.stored(users)
+        live = self.aggregate(users)
+        return {
+            key: (stored.get(key), live.get(key))
+            for key in stored.keys() | live.keys()
+            if stored.get(key) != live.get(key)
+        }
+
+    def rebuild(self, users=None):
+        """Пересобираем список покупок по корзинам."""
+        items = self.all()
+        if users is not None:
+            items = items.filter(user__in=users)
+        with transaction.atomic():
+            if users is not None:
+                self.lock(users)
+            items.delete()
+            self.bulk_create(
+                self.model(user_id=user, ingredient_id=ingredient,
+                           amount=amount)
+                for (user, ingredient), amount in self.aggregate(
+                    users
+                ).items()
+            )
+
+
+class ShoppingList(models.Model):
+    """Модель Список покупок: сумма ингредиентов из корзины."""
+    user = models.ForeignKey(
+        AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField('Кол-во')
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        ordering = ('user',)
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shoppinglist'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.ingredient}, {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """Модель Запись ленты: рецепт автора в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт',
+    )
+    # Копия Recipe.pub_date: лента листается по индексу без JOIN.
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('id',)
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry'
+            )
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.user.username} - {self.recipe.name}'
+
+
+class JobManager(models.Manager):
+    """Очередь задач в таблице БД."""
+
+    def claim(self):
+        """Забираем старейшую задачу из очереди, None - очередь пуста."""
+        while True:
+            job_id = self.filter(status=Job.PENDING).order_by(
+                'created'
+            ).values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+            if self.filter(id=job_id, status=Job.PENDING).update(
+                status=Job.RUNNING, updated=timezone.now()
+            ):
+                return self.get(id=job_id)
+
+    def requeue(self, older_than):
+        """Возвращаем в очередь задачи, зависшие у упавших обработчиков."""
+        return self.filter(
+            status=Job.RUNNING,
+            updated__lt=timezone.now() - older_than
+        ).update(status=Job.PENDING, updated=timezone.now())
+
+    def fail(self, job_id, error):
+        """Задача завершилась ошибкой."""
+        return self.filter(id=job_id).update(
+            status=Job.FAILED, error=error, updated=timezone.now()
+        )
+
+
+class Job(models.Model):
+    """Задача фонового обработчика (manage.py export_worker и др.)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    status = models.CharField(
+        'Статус', max_length=7, choices=STATUSES, default=PENDING
+    )
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    updated = models.DateTimeField('Обновлена', auto_now=True)
+
+    objects = JobManager()
+
+    class Meta:
+        abstract = True
+        ordering = ('created',)
+
+
+class ExportJob(Job):
+    """Модель Задача на выгрузку списка покупок."""
+    user = models.ForeignKey(
+        AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='export_jobs',
+        verbose_name='Пользователь',
+    )
+    file_format = models.CharField('Формат', max_length=3)
+    file = models.FileField(
+        'Файл', upload_to='jobs/', storage=export_storage, null=True,
+        blank=True
+    )
+
+    class Meta(Job.Meta):
+        verbose_name = 'Задача выгрузки'
+        verbose_name_plural = 'Задачи выгрузки'
+        indexes = [
+            models.Index(
+                fields=['status', 'created'], name='exportjob_status_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.file_format} - {self.status}'
+
+
+class ImageJob(Job):
+    """Модель Задача обработки картинки рецепта: превью и WebP."""
+    image = models.CharField('Файл', unique=True, max_length=255)
+    variants = models.JSONField('Варианты', default=dict, blank=True)
+
+    class Meta(Job.Meta):
+        verbose_name = 'Задача обработки картинки'
+        verbose_name_plural = 'Задачи обработки картинок'
+        indexes = [
+            models.Index(
+                fields=['status', 'created'], name='imagejob_status_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.image} - {self.status}'
+
+
+class Fixture(models.Model):
+    """Модель Загруженный файл справочников (manage.py seed)."""
+    name = models.CharField('Файл', unique=True, max_length=MAX_LENGTH_FIELD)
+    checksum = models.CharField('SHA-256', max_length=64)
+    loaded = models.DateTimeField('Загружен', auto_now=True)
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Загруженный справочник'
+        verbose_name_plural = 'Загруженные справочники'
+
+    def __str__(self):
+        return f'{self.name} - {self.checksum[:12]}'
+
+
+class RecipeChange(models.Model):
+    """
+    Модель Запись журнала изменений состава рецептов: по нему индексы
+    в памяти процессов (api.matcher) догоняют изменения.
+    """
+    recipe_ids = models.JSONField('Рецепты')
+    created = models.DateTimeField(
+        'Записано', default=timezone.now, db_index=True
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Изменение рецептов'
+        verbose_name_plural = 'Журнал изменений рецептов'
+
+    def __str__(self):
+        return f'{self.created:%d.%m.%Y %H:%M:%S} - {self.recipe_ids}'
+
+
+# Счетчики: модель связи -> (модель со счетчиком, поле счетчика,
+# поле связи с id строки счетчика).
+COUNTERS = {
+    Favorite: ((Recipe, 'favorites_count', 'recipe_id'),),
+    Cart: ((Recipe, 'cart_count', 'recipe_id'),),
+    Recipe: ((User, 'recipes_count', 'author_id'),),
+    Subscription: ((User, 'subscribers_count', 'author_id'),),
+}
+
+
+def update_counters(instance, delta):
+    """
+    Меняем счетчики, связанные с `instance`, на `delta`; ниже нуля
+    не опускаем (рассинхрон правит recount).
+    """
+    for model, field, foreign_key in COUNTERS[type(instance)]:
+        model.objects.filter(id=getattr(instance, foreign_key)).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+def live_counts():
+    """Пары (модель, поле, значение по связям) для всех счетчиков."""
+    for related, counters in COUNTERS.items():
+        for model, field, foreign_key in counters:
+            yield model, field, Coalesce(Subquery(
+                related.objects.filter(**{foreign_key: OuterRef('pk')})
+                .order_by().values(foreign_key)
+                .annotate(count=Count('*')).values('count')
+            ), 0)
+
+
+def counter_mismatches():
+    """Расхождения {(модель, поле, id): (хранится, по связям)}."""
+    return {
+        (model._meta.model_name, field, pk): (stored, live)
+        for model, field, count in live_counts()
+        for pk, stored, live in model.objects.order_by().annotate(
+            live=count
+        ).exclude(**{field: F('live')}).values_list('id', field, 'live')
+    }
+
+
+@transaction.atomic
+def recount():
+    """Пересчитываем все счетчики по связям."""
+    for model, field, count in live_counts():
+        model.objects.update(**{field: count})
@@ -0,0 +1,165 @@
+"""
+Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+PostgreSQL: колонка recipes_recipe.search_vector (tsvector, словарь
+russian) с GIN-индексом. SQLite: виртуальная таблица FTS5
+recipes_recipe_fts, rowid - id рецепта (для JOIN в запросе описана
+моделью RecipeSearchDocument без управления схемой). Обе создаются
+миграцией 0010: индекс обновляется явно функцией `reindex` при записи
+рецептов и сигналами при изменении ингредиентов.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Ingredient, Recipe, RecipeIngredient, RecipeSearchDocument
+
+FTS_TABLE = RecipeSearchDocument._meta.db_table
+# Вес полей: название, описание, ингредиенты.
+FTS_WEIGHTS = (10.0, 1.0, 5.0)
+# Сколько id обновлять одним запросом (лимит параметров SQLite).
+REINDEX_CHUNK_SIZE = 500
+# Гласные окончания русских слов: отрезаем, чтобы формы слова совпали.
+ENDING = re.compile(r'(?<=\w{3})[аеиоуыэюяйь]+$')
+
+SQLITE_DELETE = f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({{ids}})'
+SQLITE_INSERT = (
+    f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+    'VALUES (%s, %s, %s, %s)'
+)
+SQLITE_DOCUMENTS = f'''
+    SELECT recipe.id, recipe.name, recipe.text,
+           COALESCE(group_concat(ingredient.name, ' '), '')
+    FROM {Recipe._meta.db_table} recipe
+    LEFT JOIN {RecipeIngredient._meta.db_table} amount
+        ON amount.recipe_id = recipe.id
+    LEFT JOIN {Ingredient._meta.db_table} ingredient
+        ON ingredient.id = amount.ingredient_id
+    {{where}}
+    GROUP BY recipe.id
+'''
+# "ё" индексируем как "е", чтобы находить оба написания.
+POSTGRESQL_UPDATE = f'''
+    UPDATE {Recipe._meta.db_table} recipe SET search_vector =
+        setweight(to_tsvector(
+            'russian', translate(recipe.name, 'ёЁ', 'еЕ')
+        ), 'A')
+        || setweight(to_tsvector('russian', COALESCE((
+            SELECT string_agg(translate(ingredient.name, 'ёЁ', 'еЕ'), ' ')
+            FROM {RecipeIngredient._meta.db_table} amount
+            JOIN {Ingredient._meta.db_table} ingredient
+                ON ingredient.id = amount.ingredient_id
+            WHERE amount.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector(
+            'russian', translate(recipe.text, 'ёЁ', 'еЕ')
+        ), 'C')
+    {{where}}
+'''
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), REINDEX_CHUNK_SIZE):
+        yield ids[start:start + REINDEX_CHUNK_SIZE]
+
+
+def words(value):
+    return re.findall(r'\w+', value.lower().replace('ё', 'е'))
+
+
+def stem(value):
+    """
+    Основы слов для FTS5. Русского стеммера в SQLite нет: у слов
+    длиннее трех букв отрезаем гласные окончания ("свеклы" - "свекл").
+    """
+    return ' '.join(ENDING.sub('', word) for word in words(value))
+
+
+def reindex(recipe_ids=None):
+    """Обновляем поисковый индекс рецептов `recipe_ids` (None - всех)."""
+    if connection.vendor == 'sqlite':
+        reindex_sqlite(recipe_ids)
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            if recipe_ids is None:
+                cursor.execute(POSTGRESQL_UPDATE.format(where=''))
+            for ids in chunks(recipe_ids or ()):
+                cursor.execute(POSTGRESQL_UPDATE.format(
+                    where=f'WHERE recipe.id IN ({placeholders(ids)})'
+                ), ids)
+
+
+def reindex_sqlite(recipe_ids):
+    """В FTS5 пишем основы слов, поиск идет по точному совпадению."""
+    with connection.cursor() as cursor, connection.cursor() as insert:
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            batches = [None]
+        else:
+            batches = chunks(recipe_ids)
+        for ids in batches:
+            where = ''
+            if ids is not None:
+                cursor.execute(
+                    SQLITE_DELETE.format(ids=placeholders(ids)), ids
+                )
+                where = f'WHERE recipe.id IN ({placeholders(ids)})'
+            cursor.execute(SQLITE_DOCUMENTS.format(where=where), ids)
+            while rows := cursor.fetchmany(REINDEX_CHUNK_SIZE):
+                insert.executemany(SQLITE_INSERT, [
+                    (recipe_id, *map(stem, fields))
+                    for recipe_id, *fields in rows
+                ])
+
+
+def remove(recipe_ids):
+    """Удаляем рецепты из индекса (в PostgreSQL уходят вместе со строкой)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for ids in chunks(recipe_ids):
+            cursor.execute(SQLITE_DELETE.format(ids=placeholders(ids)), ids)
+
+
+def search(queryset, query):
+    """
+    Рецепты по запросу, по убыванию релевантности (аннотация
+    search_rank, затем id).
+    """
+    table = Recipe._meta.db_table
+    if connection.vendor == 'postgresql':
+        query = ' '.join(words(query))
+        tsquery = "websearch_to_tsquery('russian', %s)"
+        return queryset.filter(RawSQL(
+            f'{table}.search_vector @@ {tsquery}', (query,),
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({table}.search_vector, {tsquery})', (query,),
+            output_field=FloatField()
+        )).order_by('-search_rank', '-id')
+    if connection.vendor == 'sqlite':
+        expression = ' '.join(f'"{word}"' for word in stem(query).split())
+        if not expression:
+            return queryset.none()
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        # Соединение с индексом: MATCH и bm25 считаются за один проход
+        # FTS5. bm25 отрицательный: меньше - лучше.
+        return queryset.filter(
+            RawSQL(f'{FTS_TABLE} MATCH %s', (expression,),
+                   output_field=BooleanField()),
+            search_document__isnull=False
+        ).annotate(search_rank=RawSQL(
+            f'bm25({FTS_TABLE}, {weights})', (),
+            output_field=FloatField()
+        )).order_by('search_rank', '-id')
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+        | Q(ingredients__name__icontains=query)
+    ).distinct()
@@ -0,0 +1,140 @@
+"""
+Сигналы приложения recipes: счетчики, списки покупок, маска тегов
+и поисковый индекс.
+"""
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import Signal, receiver
+
+from . import search
+from .models import (Cart, Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingList, Subscription, Tag, update_counters)
+
+# Справочники изменены в обход save()/delete() (bulk-операции).
+# Аргумент models - кортеж измененных моделей.
+reference_data_changed = Signal()
+# Записан состав рецептов (создание, изменение, импорт, удаление
+# ингредиента). Аргумент recipe_ids - id рецептов.
+recipes_changed = Signal()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def counted_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def counted_deleted(sender, instance, **kwargs):
+    update_counters(instance, -1)
+
+
+@receiver(pre_save, sender=Cart)
+def cart_saving(sender, instance, raw=False, **kwargs):
+    """Запись корзины могут переназначить (админка): запомним старую."""
+    if instance.pk is not None and not raw:
+        instance._previous = Cart.objects.filter(pk=instance.pk).values_list(
+            'user_id', 'recipe_id'
+        ).first()
+
+
+@receiver(post_save, sender=Cart)
+def cart_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created:
+        previous = getattr(instance, '_previous', None)
+        if previous in (None, (instance.user_id, instance.recipe_id)):
+            return
+        user_id, recipe_id = previous
+        ShoppingList.objects.remove_recipe(recipe_id, users=(user_id,))
+    ShoppingList.objects.add_recipe(
+        instance.recipe_id, users=(instance.user_id,)
+    )
+
+
+@receiver(pre_delete, sender=Cart)
+def cart_deleting(sender, instance, **kwargs):
+    """
+    До удаления: при каскаде (удаление рецепта или его автора)
+    ингредиенты рецепта удаляются раньше, чем приходит post_delete.
+    """
+    ShoppingList.objects.remove_recipe(
+        instance.recipe_id, users=(instance.user_id,)
+    )
+
+
+def ingredient_recipes(ingredient):
+    return list(
+        RecipeIngredient.objects.filter(ingredient=ingredient).order_by()
+        .values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.reindex(ingredient_recipes(instance))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleting(sender, instance, **kwargs):
+    instance._recipe_ids = ingredient_recipes(instance)
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    recipes_changed.send(
+        sender=sender, recipe_ids=getattr(instance, '_recipe_ids', ())
+    )
+
+
+@receiver(recipes_changed)
+def recipes_search_changed(sender, recipe_ids, **kwargs):
+    search.reindex(recipe_ids)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(sender, instance, **kwargs):
+    search.remove((instance.id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.tags_mask = Recipe.objects.filter(
+            id=instance.id
+        ).update_tags_mask()[instance.id]
+        return
+    recipe_ids = pk_set
+    if action == 'post_clear':
+        recipe_ids = getattr(instance, '_recipe_ids', ())
+    Recipe.objects.filter(id__in=recipe_ids).update_tags_mask()
+
+
+@receiver(pre_save, sender=Tag)
+def tag_saving(sender, instance, **kwargs):
+    """Бит новому тегу, в том числе из loaddata."""
+    if instance.bit is None:
+        instance.bit, = Tag.objects.free_bits(1)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    """Связи с тегом удалятся каскадом, без m2m_changed."""
+    Recipe.objects.with_tags((instance.bit,)).update(
+        tags_mask=F('tags_mask') - (1 << instance.bit)
+    )
@@ -0,0 +1,85 @@
+"""
+Хранилища файлов: картинки рецептов с адресацией по содержимому
+и закрытые выгрузки списков покупок.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sharded(directory, digest, name):
+    """Путь `directory/ab/cd/name`: не больше 256 подкаталогов в каталоге."""
+    return posixpath.join(directory, digest[:2], digest[2:4], name)
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible(path='recipes.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файл сохраняется как `<каталог>/ab/cd/<sha256>.<расширение>`:
+    каталог и расширение берутся из переданного имени. Одинаковое
+    содержимое хранится один раз, повторное сохранение возвращает
+    имя существующего файла и обновляет его mtime - manage.py gc_media
+    не удаляет недавно использованные файлы.
+
+    Файл пишется во временный рядом и атомарно переименовывается:
+    параллельное сохранение того же содержимого дает тот же файл,
+    а не копию под другим именем. Брошенные временные файлы удалит
+    gc_media.
+    """
+
+    def save(self, name, content, max_length=None):
+        directory, filename = posixpath.split(name)
+        digest = content_hash(content)
+        name = sharded(
+            directory, digest, digest + os.path.splitext(filename)[1].lower()
+        )
+        path = self.path(name)
+        try:
+            os.utime(path)
+            return name
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = os.path.join(
+            os.path.dirname(path), f'.{uuid.uuid4().hex}.part'
+        )
+        # Права как у FileSystemStorage: 0o666 с учетом umask.
+        descriptor = os.open(
+            temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            # То же содержимое под тем же именем: замена безопасна.
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.unlink(temporary)
+            except FileNotFoundError:
+                pass
+            raise
+        return name
+
+
+def export_storage():
+    """Выгрузки: вне MEDIA_ROOT, файл отдается только владельцу через API."""
+    return FileSystemStorage(location=settings.EXPORT_FILES_DIR)